@@ -22,6 +22,16 @@ AUTO_DEBUG = True
 # imports needed by this module
 import os, sys, time, traceback
 
+try:
+	import thread
+except:
+	import _thread as thread
+
+try:
+	from collections import OrderedDict
+except:
+	OrderedDict = dict # pre-2.7; LRU bounds are approximate
+
 
 # common python 2/3 typedefs
 try:
@@ -58,6 +68,19 @@ except:
 DEF_INDENT = 2
 DEF_ENCODE = 'utf_8'
 
+# Subpackages that are not imported until first requested through the
+# Base.module() classmethod (or, in python 3.7+, attribute access on
+# this package). Keeps startup cheap for hubcap worker processes.
+LAZY_MODULES = ['data', 'dev', 'fmt', 'fs']
+
+# Maximum number of types held by the TFactory type cache; None for
+# no limit. See TFactory.cachesize().
+TFACTORY_CACHE_SIZE = None
+
+# When True, xdata() stores the raw traceback of the current exception
+# and extracts its entries only if/when they're displayed. See xlazy().
+XDATA_LAZY = False
+
 
 
 #
@@ -68,6 +91,9 @@ class Base(object):
 	A basic set of package-support classmethods.
 	"""
 	
+	# lazy module registry; see Base.module()
+	__modules = {}
+	
 	@classmethod
 	def config(cls, *a, **k):
 		try:
@@ -86,8 +112,11 @@ class Base(object):
 		type in the form "package.module.class".
 		
 		See the Factory class help for details about argument specs.
+		
+		Type description strings that have already been resolved by a
+		TFactory are not probed for as config file paths again.
 		"""
-		if isinstance(conf, basestring):
+		if isinstance(conf, basestring) and not TFactory.cached(conf):
 			# Don't allow Path.expand to raise an exception if the file
 			# doesn't exist; in such a case, conf is a type description 
 			# string.
@@ -124,6 +153,31 @@ class Base(object):
 		"""
 		return cls.create(cls.innerpath(innerPath), *a, **k)
 	
+	@classmethod
+	def module(cls, innerPath):
+		"""
+		Return the module or package described by `innerPath` (eg, 'fs', 
+		'data.pdq'), importing it on first request. Loaded modules are
+		stored in a registry so later calls cost only a dict lookup.
+		"""
+		try:
+			return Base.__modules[innerPath]
+		except KeyError:
+			path = Base.innerpath(innerPath)
+			try:
+				__import__(path)
+			except Exception as ex:
+				raise type(ex)('module-import-fail', xdata(
+					python=str(ex), path=path, innerpath=innerPath
+				))
+			Base.__modules[innerPath] = sys.modules[path]
+			return Base.__modules[innerPath]
+	
+	@classmethod
+	def modules(cls):
+		"""Return a sorted list of inner paths loaded by Base.module()."""
+		return sorted(Base.__modules.keys())
+	
 	@classmethod
 	def path(cls, *a, **k):
 		"""
@@ -153,6 +207,106 @@ class Base(object):
 
 
 
+#
+# TYPE CACHE
+#
+class TypeCache(object):
+	"""
+	A lock-protected map of type description strings to resolved types.
+	Hits, misses, and evictions are counted. If a `size` is given, the
+	least recently used types are dropped when the cache grows larger.
+	"""
+	
+	def __init__(self, size=None):
+		self.__size = size
+		self.__lock = thread.allocate_lock()
+		self.__cache = OrderedDict()
+		self.__hits = self.__misses = self.__evictions = 0
+	
+	def __len__(self):
+		return len(self.__cache)
+	
+	def __contains__(self, key):
+		return key in self.__cache
+	
+	@property
+	def size(self):
+		"""Maximum number of cached types; None for no limit."""
+		return self.__size
+	
+	@size.setter
+	def size(self, size):
+		with self.__lock:
+			self.__size = size
+			self.__trim()
+	
+	def get(self, key):
+		"""Return the cached type for `key`, or None."""
+		with self.__lock:
+			try:
+				T = self.__cache[key]
+			except KeyError:
+				self.__misses += 1
+				return None
+			self.__hits += 1
+			if self.__size:
+				self.__cache[key] = self.__cache.pop(key)
+			return T
+	
+	def put(self, key, T):
+		"""Store type `T` for description string `key`."""
+		with self.__lock:
+			self.__cache[key] = T
+			self.__trim()
+	
+	def invalidate(self, prefix=None):
+		"""
+		Remove cached types. If `prefix` is given, only descriptions that
+		equal the prefix or start with "<prefix>." are removed; otherwise
+		the whole cache is cleared. Returns the number removed.
+		"""
+		with self.__lock:
+			if prefix is None:
+				keys = list(self.__cache.keys())
+			else:
+				pp = "%s." % prefix
+				keys = [
+					k for k in self.__cache if (k==prefix) or k.startswith(pp)
+				]
+			for k in keys:
+				del(self.__cache[k])
+			return len(keys)
+	
+	def stats(self):
+		"""Return a dict with cache counters."""
+		with self.__lock:
+			return dict(
+				size=self.__size, count=len(self.__cache), hits=self.__hits,
+				misses=self.__misses, evictions=self.__evictions
+			)
+	
+	def __trim(self):
+		# caller must hold the lock
+		if self.__size:
+			while len(self.__cache) > self.__size:
+				try:
+					self.__cache.popitem(last=False)
+				except TypeError:
+					self.__cache.popitem()
+				self.__evictions += 1
+
+
+
+
+
+# builtins, as a dict, for TFactory
+try:
+	BUILTINS = dict(__builtins__)
+except TypeError:
+	BUILTINS = dict(__builtins__.__dict__)
+
+
+
 #
 # T-FACTORY - Type Factory
 #
@@ -160,7 +314,31 @@ class TFactory(object):
 	
 	# class values
 	FACTORY_LEVEL = 0
-	__cache = {}
+	__cache = TypeCache(TFACTORY_CACHE_SIZE)
+	
+	@classmethod
+	def cachesize(cls, size):
+		"""Set the maximum type cache size; None for no limit."""
+		TFactory.__cache.size = size
+	
+	@classmethod
+	def cachestats(cls):
+		"""Return a dict of type cache counters."""
+		return TFactory.__cache.stats()
+	
+	@classmethod
+	def cached(cls, typeDesc):
+		"""True if `typeDesc` is a type description string in the cache."""
+		return typeDesc in TFactory.__cache
+	
+	@classmethod
+	def invalidate(cls, prefix=None):
+		"""
+		Drop cached types so they'll be resolved again on next request;
+		if `prefix` is given, only types within that python path. This
+		is called by core.coreload() after modules are reloaded.
+		"""
+		return TFactory.__cache.invalidate(prefix)
 	
 	def __init__(self, typeInfo):
 		"""
@@ -239,8 +417,9 @@ class TFactory(object):
 	#
 	def __ftype(self, id):
 		
-		if id in self.__cache:
-			return self.__cache[id]
+		T = self.__cache.get(id)
+		if T is not None:
+			return T
 		
 		arPath = id.split('.')
 		sFull = '.'.join(arPath)
@@ -248,9 +427,10 @@ class TFactory(object):
 		sPath = '.'.join(arPath)
 		
 		# try to handle system-defined types as well
-		if sType in globals()['__builtins__'].keys():
-			tt = globals()['__builtins__'][sType]
+		if sType in BUILTINS:
+			tt = BUILTINS[sType]
 			if isinstance(tt, type):
+				self.__cache.put(id, tt)
 				return tt
 		
 		#
@@ -275,7 +455,7 @@ class TFactory(object):
 				type=sType, path=sFull
 			))
 		"""
-		self.__cache[id] = T
+		self.__cache.put(id, T)
 		return T
 	
 	
@@ -345,27 +525,116 @@ class Factory(TFactory):
 		constructor. Any given kwargs update a copy of the kwargs given 
 		to the constructor.
 		"""
-		kk = dict(self.__k)
-		kk.update(k)
+		if k:
+			kk = dict(self.__k)
+			kk.update(k)
+		else:
+			kk = self.__k
 		a = a if a else self.__a
 		return self.type(*a, **kk)
+	
+	
+	# COMPILE
+	def compile(self):
+		"""
+		Return a function that creates objects exactly as create() does,
+		but with the type resolved and the constructor's args and kwargs
+		bound in advance. When called with no arguments, it goes straight
+		to the type; use it where many objects are created in a loop.
+		
+		>>> fn = Factory('pyrox.data.param.Param', None).compile()
+		>>> params = [fn(v, i) for i,v in enumerate(data)]
+		"""
+		T = self.type
+		fa = tuple(self.__a)
+		fk = dict(self.__k)
+		
+		def fcreate(*a, **k):
+			if k:
+				kk = dict(fk)
+				kk.update(k)
+				return T(*(a or fa), **kk)
+			return T(*(a or fa), **fk)
+		
+		return fcreate
 
 
 
 
 
 
-def tracebk():
-	"""Return current exception's traceback as a list."""
+def tracebk(lazy=False):
+	"""
+	Return current exception's traceback as a list. If `lazy` is True,
+	return a LazyTraceback, which extracts the list only when needed.
+	"""
 	tb = sys.exc_info()[2]
 	if tb:
 		try:
+			if lazy:
+				return LazyTraceback(tb)
 			return list(traceback.extract_tb(tb))
 		finally:
 			del(tb)
 
 
 
+class LazyTraceback(object):
+	"""
+	Holds a traceback object in place of the list of entries returned
+	by tracebk(). The list is extracted (once) on first use - usually
+	when the exception is displayed by dev.Debug - after which the
+	traceback object is released.
+	
+	A LazyTraceback pickles as a plain list, so xdata can still pass
+	through multiprocessing queues.
+	"""
+	def __init__(self, tb):
+		self.__tb = tb
+		self.__list = None
+	
+	def __iter__(self):
+		return iter(self.list)
+	
+	def __bool__(self):
+		return True
+	
+	__nonzero__ = __bool__
+	
+	def __len__(self):
+		return len(self.list)
+	
+	def __getitem__(self, i):
+		return self.list[i]
+	
+	def __repr__(self):
+		return repr(self.list)
+	
+	def __reduce__(self):
+		return (list, (self.list,))
+	
+	@property
+	def list(self):
+		"""The extracted list of traceback entries."""
+		if self.__list is None:
+			self.__list = list(traceback.extract_tb(self.__tb))
+			self.__tb = None
+		return self.__list
+
+
+
+def xlazy(lazy=True):
+	"""
+	Set XDATA_LAZY. While True, xdata() stores a LazyTraceback instead
+	of extracting traceback entries each time an exception is wrapped.
+	This makes raising through xdata much cheaper on paths where most
+	exceptions are handled and never displayed.
+	"""
+	global XDATA_LAZY
+	XDATA_LAZY = True if lazy else False
+
+
+
 def xdata(xdata=None, **k):
 	"""
 	Package extensive exception data into a dict to be passed as the
@@ -385,6 +654,8 @@ def xdata(xdata=None, **k):
 	 * The pyro package standard is to pass a 'dash-separated-error'
 	   string as the first argument and an xdata dict as the second 
 	   argument in any exception thrown (or caught and rethrown)..
+	 * If XDATA_LAZY is set (see xlazy()), the `tracebk` value is a
+	   LazyTraceback rather than a list.
 	"""
 	# argument management
 	xdata = xdata or {}
@@ -403,9 +674,14 @@ def xdata(xdata=None, **k):
 		if xtype or xval:
 			xprior['xtype'] = xtype
 			xprior['xargs'] = xval.args
-			tblist = tracebk()
-			if tblist:
-				xprior['tracebk'] = list(tblist)
+			if XDATA_LAZY:
+				tblist = tracebk(lazy=True)
+				if tblist:
+					xprior['tracebk'] = tblist
+			else:
+				tblist = tracebk()
+				if tblist:
+					xprior['tracebk'] = list(tblist)
 			r['prior'] = xprior
 		return r
 	finally:
@@ -417,14 +693,43 @@ def xdata(xdata=None, **k):
 
 
 
+#
+# LAZY SUBPACKAGES (python 3.7+)
+#
+def __getattr__(name):
+	"""Import LAZY_MODULES subpackages on first attribute access."""
+	if name in LAZY_MODULES:
+		return Base.module(name)
+	raise AttributeError(name)
+
+
+
+
 #
 # DEV / DEBUG
 #
 def debug(debug=True, showtb=True):
 	"""Enable/disable debugging/traceback."""
-	TFactory(Base.innerpath('dev.debug')).type(debug,showtb)
+	Base.module('dev').debug(debug,showtb)
+
 
+def deferdebug(t, v, tb):
+	"""
+	Exception hook installed when AUTO_DEBUG is set. The dev package
+	(and the fmt/json modules it needs) is imported only when an 
+	uncaught exception actually has to be displayed. If that fails,
+	the hook that was set before this one (PRIOR_EXCEPTHOOK) is used.
+	"""
+	try:
+		debug()
+	except Exception:
+		sys.excepthook = PRIOR_EXCEPTHOOK
+	sys.excepthook(t, v, tb)
+
+# the exception hook deferdebug replaces; dev.Debug restores it when
+# debugging is turned off
+PRIOR_EXCEPTHOOK = sys.excepthook
 if AUTO_DEBUG:
-	debug()
+	sys.excepthook = deferdebug
 
 
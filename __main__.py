@@ -9,6 +9,9 @@ python -m pyrox --help
 python -m pyrox --ipath # print the `innerpath` to pyrox package
 python -m pyrox --test  # test loading of modules and file wrapper io
 python -m pyrox --clean # remove .pyc files and __pycache__ directories
+python -m pyrox --import-profile [--budget SECONDS] [innerpath ...]
+                        # per-module import time and RSS
+python -m pyrox --bench <name>  # run a dev.bench benchmark report
 """
 
 
@@ -38,6 +41,21 @@ if __name__ == '__main__':
 		from pyrox.dev import test
 		test.report()
 	
+	# import time/memory profile
+	elif cmd == '--import-profile':
+		budget = None
+		if '--budget' in args:
+			x = args.index('--budget')
+			budget = float(args[x+1])
+			args = args[:x] + args[x+2:]
+		iprofile = Base.module('dev.iprofile')
+		if not iprofile.report(args, budget):
+			sys.exit(1)
+	
+	# benchmarks
+	elif cmd == '--bench':
+		Base.module('dev.bench').report(*args)
+	
 	# remove *.pyc files
 	elif cmd == '--clean':
 		d = Base.ncreate('fs.dir.Dir', *args[1:])
@@ -25,9 +25,15 @@ def oncoreload():
 	project, including any packages above it in the directory structure,
 	and all their contained packages and modules. The core._coreload
 	module must be called, too.
+	
+	Types cached by TFactory are invalidated so that objects created
+	after the reload are of the reloaded types.
 	"""
-	from .. import _coreload as base_coreload
-	reload(base_coreload)
+	try:
+		from .. import _coreload as base_coreload
+		reload(base_coreload)
+	finally:
+		TFactory.invalidate()
 
 
 
@@ -17,13 +17,38 @@ for item in cursor.Cursor([[1,2,3], [4,5,6]]).gen:
 
 * UNDER CONSTRUCTION - VERY EARLY DEVELOPMENT - UNRELIABLE *
 
-# FAILS...
+Pass kwarg reiterate=True to walk nested lists and dicts; each param's
+`i` is then the path to its value.
+
 d={'a':1,'b':9,'c':['food!']}
-reload(cursor).TEST(d, use=lambda p: p.v==['food'])
+cursor.Cursor(d, reiterate=True, use=lambda p: p.v=='food!').fetch().i
+
+
+COLUMN CURSOR:
+ColumnCursor iterates through array.array, memoryview, list, or (if
+installed) numpy array columns in fixed-size batches, yielding Batch
+objects. The `use` callback receives a whole batch and may select a
+subset of its rows by returning a mask.
+
+cc = cursor.ColumnCursor(array.array('d', data), size=8192,
+	use=lambda b: [x > 0.5 for x in b.v]
+)
+for batch in cc:
+	print (batch.i, batch.index, batch.v)
 
 """
 
+import array, itertools, multiprocessing
+
 from .param import *
+from .pred import Pred
+
+
+# default number of rows per ColumnCursor batch
+CURSOR_BATCH = 4096
+
+# default number of items sent to each Cursor.parallel() worker task
+CURSOR_CHUNK = 1024
 
 
 
@@ -57,14 +82,15 @@ class Cursor(object):
 		applied to each data item read by the cursor generator; if False
 		is returned, the item is ignored and the cursor moves on to test
 		the next item. Data items are yielded only when `use` returns
-		True.
+		True. A data.pred.Pred predicate is compiled before use.
 		
 		A custom Param object may be specified using the kwarg `param`. 
 		If unspecified, data.param.Param will be used. Regardless, the 
-		same cursor is passed to each including values whose members are 
-		"reiterated" using another cursor generated by the param. 
+		same param is passed for every item.
 		
-		[REM: Check that the above is implemented.]
+		If kwarg `reiterate` is True, the members of nested lists and
+		dicts are "reiterated", yielding only non-container values; see
+		genwalk().
 		
 		FETCH:
 		After creating a generator, this constructor sets self.fetch the 
@@ -81,8 +107,14 @@ class Cursor(object):
 		# get optional param object
 		self.__param = k.get('param', Param())
 		
+		# keep data and original `use` for parallel()
+		self.__data = data
+		self.__fuse = k.get('use')
+		
 		# get the use method
 		self.__use = k.get('use')
+		if isinstance(self.__use, Pred):
+			self.__use = self.__use.compile()
 		
 		# use must be callable
 		if self.__use and (not callable(self.__use)):
@@ -149,22 +181,106 @@ class Cursor(object):
 		return [p.v for p in self.__gen]
 	
 	
+	def parallel(self, workers=None, chunk=CURSOR_CHUNK, ordered=True):
+		"""
+		Return a new Cursor that applies this cursor's `use` callback to
+		its data in a pool of `workers` processes (default: one for each
+		cpu). Data is sent to workers in lists of `chunk` items; for 
+		streams, that's `chunk` lines.
+		
+		Each worker gets its own copy of this cursor's param object (see
+		the `param` kwarg), so custom Param methods and attributes work
+		in `use` just as they do for each() and select(). Each Param
+		keeps the index, offset, or key (Param.i) it would have had from
+		this cursor. Results are in the original order 
+		unless `ordered` is False, in which case each chunk's results
+		are yielded as soon as they're available.
+		
+		NOTE: Where processes are spawned rather than forked (eg, on
+		      Windows), `use` must be picklable, so lambdas can't be
+		      used; use a module-level function or a data.pred.Pred.
+		"""
+		if self.__fuse is None:
+			raise Exception('cursor-parallel-fail', xdata(
+				reason='callback-required', callback='use'
+			))
+		return Cursor(gen=self.genparallel(workers, chunk, ordered))
+	
+	
+	def genparallel(self, workers=None, chunk=CURSOR_CHUNK, ordered=True):
+		"""Yields params whose values were accepted by pool workers."""
+		param = self.__param
+		pairs = self.genpairs(self.__data)
+		chunks = iter(lambda: list(itertools.islice(pairs, chunk)), [])
+		pool = multiprocessing.Pool(workers, pcinit, (self.__fuse, param))
+		try:
+			imap = pool.imap if ordered else pool.imap_unordered
+			for result in imap(pcchunk, chunks):
+				for i, v in result:
+					param.v = v
+					param.i = i
+					yield param
+			pool.close()
+			pool.join()
+		finally:
+			pool.terminate()
+	
+	
+	def genpairs(self, x):
+		"""
+		Yields an (i, v) tuple for each item in `x`; `i` is the index,
+		offset, or key the matching generator would give.
+		"""
+		gen = self.gentype(x)
+		if gen == self.genmap:
+			for key in x:
+				yield (key, x[key])
+		elif gen == self.genval:
+			yield (None, x)
+		elif gen == self.gengen:
+			for i, v in enumerate(x):
+				if isinstance(v, Param):
+					yield (v.i, v.v)
+				else:
+					yield (i, v)
+		else:
+			for i, v in enumerate(x):
+				yield (i, v)
+	
+	
 	def gentype(self, x=None, **k):
 		"""
 		Return a generator suitable to the type and/or attributes of the
 		argument object `x`.
 		
+		The first object of each type is probed (see gtprobe()) to pick
+		the generator; the choice is cached by type so later objects of
+		that type are dispatched with a single dict lookup.
+		"""
+		try:
+			return getattr(self, Cursor.__gtypes[type(x)])
+		except KeyError:
+			name = Cursor.__gtypes[type(x)] = self.gtprobe(x)
+			return getattr(self, name)
+	
+	
+	# type -> generator method name; see gentype()
+	__gtypes = {}
+	
+	
+	@classmethod
+	def gtprobe(cls, x):
+		"""
+		Return the name of the generator method suited to object `x`.
+		
 		NOTE: This method uses type and various combinations of object
 		      attributes to try to determine which generator to use; it
 		      may take a while before I can work out all the kinks.
 		"""
 		
-		# DEBUGGING!
-		#print (type(x).__name__)
-		
 		# if it's already a generator, return it
 		if (type(x).__name__ == 'generator'):
-			return self.gengen
+			return 'gengen'
 		
 		# text input (via file, url, or string) will probably be the most
 		# common *FIRST* thing to be cursored over, then yielding a list
@@ -173,44 +289,41 @@ class Cursor(object):
 		# best file or string io is lower in the list
 		try:
 			x.readline
-			return self.genlines
+			return 'genlines'
 		except AttributeError:
 			# this object does not have .readline()
 			pass
 		
 		# list, dict, and string will probably be the most common types
-		# when recursing; unfortunately, they have to come in the wrong
-		# order; Maybe I can find a way to improve speed here.
+		# when recursing; since results are cached by type, the order of
+		# these probes no longer matters for speed.
 		try:
 			x.keys
 			x.__getitem__
-			return self.genmap
+			return 'genmap'
 		except AttributeError:
 			pass
 		
 		# make sure a string isn't thrown in with list, tupel, etc...
 		if isinstance(x, basestring):
-			return self.genval
+			return 'genval'
 		
 		# any sequence that doesn't have keys
 		# REM: MUST come after dict
 		try:
 			x.__getitem__
-			return self.genseq
+			return 'genseq'
 		except AttributeError:
 			pass
 		
 		try:
 			if x == x.__iter__():
-				return self.geniter
+				return 'geniter'
 		except Exception:
 			pass
 		
-		# uncomment to debug
-		#return type(x)
-		
 		# if all else fails...
-		return self.genval
+		return 'genval'
 	
 	
 	def generator(self, data=None, **k):
@@ -221,36 +334,79 @@ class Cursor(object):
 		if 'gen' in k:
 			return k['gen']
 		
+		if k.get('reiterate'):
+			return self.genwalk(data)
+		
 		gen = self.gentype(data, **k)
 		return gen(data)
 	
 	
 	def gengen(self, x):
+		"""
+		Yields each item of generator `x`. Items that are Param objects
+		(eg, from another cursor's generator) keep their value and index;
+		other items are indexed by offset.
+		"""
 		param = self.__param
 		use = self.__use
-		for p in x:
-			if use:
-				for i,v in enumerate(x):
-					param.v = v.v
-					param.i = i
-					if use(param):
-						yield param
+		for i,v in enumerate(x):
+			if isinstance(v, Param):
+				param.v = v.v
+				param.i = v.i
 			else:
-				for i,v in enumerate(x):
-					param.v = v.v
-					param.i = i
-					yield param
-			
+				param.v = v
+				param.i = i
+			if (not use) or use(param):
+				yield param
+	
 	
 	def genval(self, x):
-		p = self.__param
-		p.v = x
-		p.i = None
-		if not use:
-			yield p
-		elif use(p):
-			yield p
+		"""Yields single value `x`."""
+		param = self.__param
+		use = self.__use
+		param.v = x
+		param.i = None
+		if (not use) or use(param):
+			yield param
+	
+	
+	def genwalk(self, x):
+		"""
+		Yields each "leaf" value within nested lists, tuples, dicts (or
+		similar containers) in `x`. Param.i is a tuple giving the path of
+		offsets and keys to the value. Nesting is tracked in a list, so 
+		depth is not limited by python's recursion limit.
 		
+		Use kwarg reiterate=True to select this generator.
+		"""
+		param = self.__param
+		use = self.__use
+		nest = ('genseq', 'genmap')
+		stack = [self.genpairs(x)]
+		path = []
+		while stack:
+			try:
+				i, v = next(stack[-1])
+			except StopIteration:
+				stack.pop()
+				if path:
+					path.pop()
+				continue
+			
+			# containers are walked; strings and bytes are leaf values
+			try:
+				g = Cursor.__gtypes[type(v)]
+			except KeyError:
+				g = Cursor.__gtypes[type(v)] = self.gtprobe(v)
+			if (g in nest) and not isinstance(v, pxbytes):
+				path.append(i)
+				stack.append(self.genpairs(v))
+			else:
+				param.v = v
+				param.i = tuple(path) + (i,)
+				if (not use) or use(param):
+					yield param
+	
 	
 	def genseq(self, x):
 		"""
@@ -330,3 +486,272 @@ class Cursor(object):
 				yield param
 
 
+
+
+
+
+
+
+#
+# PARALLEL CURSOR WORKERS
+#
+PC_USE = None
+PC_PARAM = None
+
+def pcinit(use, param=None):
+	"""
+	Pool initializer; stores the `use` callback and the param object
+	(the worker's copy of the cursor's param) for pcchunk().
+	"""
+	global PC_USE, PC_PARAM
+	PC_USE = use.compile() if isinstance(use, Pred) else use
+	PC_PARAM = Param() if param is None else param
+
+
+def pcchunk(chunk):
+	"""Return (i, v) for each item in `chunk` accepted by `use`."""
+	use = PC_USE
+	param = PC_PARAM
+	r = []
+	for i, v in chunk:
+		param.v = v
+		param.i = i
+		if use(param):
+			r.append((param.i, param.v))
+	return r
+
+
+
+
+
+#
+# COLUMN CURSOR
+#
+class ColumnCursor(object):
+	"""
+	ColumnCursor objects are for one-time iteration through columnar
+	data in batches of (at most) `size` rows. Pass a single column or a
+	dict mapping names to columns of equal length. Columns may be any
+	sliceable sequence; array.array, memoryview, and numpy arrays are
+	sliced without per-row python work.
+	
+	Each Batch yielded has the batch's column slice (or a dict of them,
+	for named columns) as its `v` value, and the offset of its first 
+	row as `i`.
+	
+	The optional `use` callable is applied to each Batch. It may return
+	a single boolean to keep or skip the whole batch, or a mask - one
+	true/false value per row - to keep only matching rows. For masked 
+	batches, Batch.index lists the original offset of each kept row.
+	Batches left with no rows are skipped. A data.pred.Pred predicate
+	is compiled to a kernel that computes the mask for a whole batch.
+	"""
+	
+	def __init__(self, columns, **k):
+		"""
+		Pass `columns` and optional kwargs `size` (rows per batch, default
+		CURSOR_BATCH) and `use` (a callable; see class help).
+		"""
+		self.__cols = columns
+		self.__named = isinstance(columns, dict)
+		self.__size = k.get('size', CURSOR_BATCH)
+		self.__use = k.get('use')
+		if isinstance(self.__use, Pred):
+			self.__use = self.__use.kernel()
+		
+		# use must be callable
+		if self.__use and (not callable(self.__use)):
+			raise Exception('cursor-create-fail', 
+				xdata(reason='callback-not-callable', callback='use')
+			)
+		
+		# all columns must have the same length
+		if self.__named:
+			lens = set([len(columns[c]) for c in columns])
+			if len(lens) > 1:
+				raise ValueError('cursor-create-fail', xdata(
+					reason='column-length-mismatch', lengths=sorted(lens)
+				))
+			self.__len = lens.pop() if lens else 0
+		else:
+			self.__len = len(columns)
+		
+		self.__gen = self.genbatch()
+		
+		# steal the generator's 'next' method
+		try:
+			self.fetch = self.__gen.__next__ # python 3
+		except:
+			self.fetch = self.__gen.next # python 2
+	
+	
+	def __iter__(self):
+		return self.__gen
+	
+	
+	@property
+	def gen(self):
+		return self.__gen
+	
+	@property
+	def len(self):
+		"""Total number of rows in the columns."""
+		return self.__len
+	
+	@property
+	def size(self):
+		"""Rows per batch."""
+		return self.__size
+	
+	
+	def fetch(self):
+		"""
+		Return the next Batch. (Replaced in the constructor by the
+		generator's next method.)
+		"""
+		pass # replaced in constructor
+	
+	
+	def fetchall(self):
+		"""Return a list of all remaining Batch objects."""
+		return [b for b in self.__gen]
+	
+	
+	def values(self):
+		"""
+		Return all remaining selected values joined into one column (or,
+		for named columns, a dict of columns) of the original type where
+		possible.
+		"""
+		bb = [b.v for b in self.__gen]
+		if self.__named:
+			return dict([
+				[c, coljoin(self.__cols[c], [v[c] for v in bb])]
+					for c in self.__cols
+			])
+		return coljoin(self.__cols, bb)
+	
+	
+	def genbatch(self):
+		"""Yields a Batch for each `size` rows; applies `use`."""
+		cols = self.__cols
+		size = self.__size
+		use = self.__use
+		named = self.__named
+		for a in range(0, self.__len, size):
+			b = a + size
+			if named:
+				v = dict([[c, cols[c][a:b]] for c in cols])
+			else:
+				v = cols[a:b]
+			batch = Batch(v, a)
+			if not use:
+				yield batch
+			else:
+				r = use(batch)
+				if (r is True) or (r is False) or not hasattr(r, '__len__'):
+					if r:
+						yield batch
+				elif batch.select(r):
+					yield batch
+
+
+
+
+
+class Batch(Param):
+	"""
+	A block of rows from a ColumnCursor. Value `v` is a column slice or
+	a dict of them; `i` is the offset of the batch's first row. After 
+	a mask is applied by select(), `index` lists the original offset 
+	of each remaining row (otherwise it's None).
+	"""
+	def __init__(self, v=None, i=None):
+		Param.__init__(self, v, i)
+		self.index = None
+	
+	@property
+	def len(self):
+		"""Number of rows in this batch."""
+		if isinstance(self.v, dict):
+			for c in self.v:
+				return len(self.v[c])
+			return 0
+		return len(self.v)
+	
+	@property
+	def rows(self):
+		"""Range or list of original offsets of this batch's rows."""
+		if self.index is None:
+			return range(self.i, self.i + self.len)
+		return self.index
+	
+	def select(self, mask):
+		"""
+		Keep only rows whose `mask` value is true; Returns the number of
+		rows remaining.
+		"""
+		self.index = colcompress(self.rows, mask, True)
+		if isinstance(self.v, dict):
+			self.v = dict([[c, colcompress(self.v[c], mask)] for c in self.v])
+		else:
+			self.v = colcompress(self.v, mask)
+		return self.len
+
+
+
+
+#
+# COLUMN UTILITIES
+#
+
+def isnumpy(col):
+	"""True if `col` is a numpy array (without importing numpy)."""
+	return type(col).__module__ == 'numpy'
+
+
+def coltype(col):
+	"""Return the array typecode for `col`, or None if not applicable."""
+	try:
+		return col.typecode
+	except AttributeError:
+		try:
+			fmt = col.format
+			array.array(fmt)
+			return fmt
+		except Exception:
+			return None
+
+
+def colcompress(col, mask, index=False):
+	"""
+	Return the items of `col` whose `mask` values are true, as the same
+	kind of column where possible. If `index` is True, `col` is a range
+	or list of row offsets and a list (or numpy array) of the offsets
+	selected is returned.
+	"""
+	if isnumpy(mask):
+		np = sys.modules['numpy']
+		if index:
+			return np.asarray(col, dtype=np.intp)[mask.astype(bool)]
+		if isnumpy(col):
+			return col[mask]
+		mask = mask.tolist()
+	elif isnumpy(col):
+		return col[sys.modules['numpy'].asarray(mask, dtype=bool)]
+	
+	vv = itertools.compress(col, mask)
+	tc = None if index else coltype(col)
+	return array.array(tc, vv) if tc else list(vv)
+
+
+def coljoin(col, parts):
+	"""Join column slices `parts` into one column like `col`."""
+	if isnumpy(col):
+		np = sys.modules['numpy']
+		return np.concatenate(parts) if parts else col[0:0]
+	tc = coltype(col)
+	r = array.array(tc) if tc else []
+	for p in parts:
+		r.extend(p)
+	return r
@@ -4,11 +4,68 @@ This file is part of the aimy project, distributed under
 the terms of the GNU Affero General Public License.
 
 Wraps database modules that implement the DB-API 2.0 interface.
+
+A Database holds a single connection. Threads that need to query the
+same database concurrently should each use their own Database from a
+DatabasePool. An AsyncDatabase runs a Database on its own worker 
+thread so that event loops don't block on long queries.
 """
 
 
 from .. import *
 
+import bisect, collections, contextlib, itertools, re, threading, time
+
+try:
+	import queue
+except ImportError:
+	import Queue as queue
+
+# AsyncDatabase requires concurrent.futures (the `futures` package, for
+# python 2)
+try:
+	from concurrent.futures import Future
+except ImportError:
+	Future = None
+
+
+# rows per executemany call in opmany()
+DB_CHUNK = 1000
+
+# upper bounds (seconds) of op latency histogram buckets; see opstats()
+DB_HIST = (0.0001, 0.001, 0.01, 0.1, 1.0)
+
+# sqlite3 pragma sets for config key 'profile'; pragmas are applied in
+# the order given. Negative cache_size values are in KiB.
+DB_PROFILES = {
+	# fast loading; a crash may lose the most recent transactions
+	'bulk' : [
+		('auto_vacuum', 'INCREMENTAL'), ('journal_mode', 'WAL'),
+		('synchronous', 'OFF'), ('cache_size', -65536),
+		('temp_store', 'MEMORY'), ('mmap_size', 268435456)
+	],
+	# concurrent readers with occasional writes
+	'readmostly' : [
+		('auto_vacuum', 'INCREMENTAL'), ('journal_mode', 'WAL'),
+		('synchronous', 'NORMAL'), ('cache_size', -32768),
+		('temp_store', 'MEMORY'), ('mmap_size', 268435456)
+	],
+	# every commit is synced to disk
+	'durable' : [
+		('auto_vacuum', 'INCREMENTAL'), ('journal_mode', 'WAL'),
+		('synchronous', 'FULL'), ('cache_size', -8192)
+	]
+}
+
+# stream() fetch sizes: the initial chunk, its limits, and the target
+# seconds per fetchmany call when sizes adapt
+DB_STREAM_CHUNK = 256
+DB_STREAM_MIN = 16
+DB_STREAM_MAX = 16384
+DB_STREAM_TARGET = 0.01
+
+# pragma names and values must match this pattern
+DB_PRAGMA_RE = re.compile(r'^-?[A-Za-z0-9_]+$')
 
 
 class Database(object):
@@ -24,6 +81,8 @@ class Database(object):
 		 - args  : arguments to be passed to the open() method.
 		 - path  : file path to the db file (if applicable); if included,
 		           this value is prepended to args.
+		 - profile: sqlite3 only; the name of a DB_PROFILES pragma set,
+		           or a list of [pragma, value] pairs, applied on open.
 		
 		Or, pass the file path to the JSON or python text representation
 		of a dict containing such a configuration.
@@ -47,6 +106,8 @@ class Database(object):
 		# sql
 		self.__sql = conf.get('sql', {})
 		self.__op = self.__sql.get('op', {})
+		self.__profile = conf.get('profile')
+		self.__stmt = {}
 	
 	
 	def config(self, config=None, *a, **k):
@@ -144,6 +205,10 @@ class Database(object):
 	def sop(self):
 		return self.__op
 	
+	@property
+	def profile(self):
+		return self.__profile
+	
 	
 	# CAT
 	def cat(self, cat):
@@ -193,6 +258,14 @@ class Database(object):
 				python=str(ex), args=self.__args, kwargs=kwargs
 			))
 		
+		# performance profile
+		if self.__profile:
+			try:
+				self.__applyprofile(self.__profile)
+			except:
+				self.close()
+				raise
+		
 		# auto-init
 		if not self.__autoinit:
 			self.__inited = True
@@ -219,8 +292,82 @@ class Database(object):
 				self.__con.close()
 		finally:
 			self.__con = None
+			for st in self.__stmt.values():
+				st.cursor = None
+	
+	
+	
+	# PRAGMA
+	def pragma(self, name, value=None):
+		"""
+		Sqlite3 only. Set pragma `name` to `value`, if given, and return
+		the pragma's value (or None, if the pragma returns no value).
+		"""
+		if not DB_PRAGMA_RE.match(name) or not (
+				value is None or DB_PRAGMA_RE.match(str(value))
+			):
+			raise ValueError('db-pragma-invalid', self.xdata(
+				pragma=name, value=value
+			))
+		if value is None:
+			sql = "pragma %s" % name
+		else:
+			sql = "pragma %s=%s" % (name, value)
+		r = self.query(sql).fetchone()
+		return r[0] if r else None
+	
+	
+	# OPTIMIZE
+	def optimize(self, pages=None):
+		"""
+		Sqlite3 only. Gather statistics for the query planner (ANALYZE),
+		return up to `pages` free pages to the filesystem (all, if None)
+		when the database uses incremental auto_vacuum, and checkpoint
+		the write-ahead log in WAL mode. Other connections may continue
+		to use the database meanwhile. 
+		
+		Returns a dict: `free`, the number of free pages before, and
+		`freed`, the number of pages returned to the filesystem.
+		"""
+		if self.__modname != 'sqlite3':
+			raise ValueError('db-optimize-invalid', self.xdata(
+				reason='sqlite3-required'
+			))
+		free = self.pragma('freelist_count')
+		self.query("analyze")
+		self.commit()
+		if self.pragma('auto_vacuum') == 2:
+			# executescript steps the pragma to completion (execute would
+			# free only one page)
+			try:
+				self.__con.executescript("pragma incremental_vacuum(%i);" % (
+					-1 if pages is None else pages
+				))
+			except Exception as ex:
+				self.__rollback()
+				raise type(ex)('db-optimize-fail', self.xdata(python=str(ex)))
+		if str(self.pragma('journal_mode')).lower() == 'wal':
+			self.query("pragma wal_checkpoint(PASSIVE)").fetchall()
+		return dict(free=free, freed=free - self.pragma('freelist_count'))
 	
 	
+	# APPLY PROFILE
+	def __applyprofile(self, profile):
+		if self.__modname != 'sqlite3':
+			raise ValueError('db-profile-invalid', self.xdata(
+				reason='sqlite3-required', profile=profile
+			))
+		if isinstance(profile, basestring):
+			try:
+				profile = DB_PROFILES[profile]
+			except KeyError:
+				raise KeyError('db-profile-invalid', self.xdata(
+					reason='unknown-profile', profile=profile,
+					profiles=sorted(DB_PROFILES.keys())
+				))
+		for name, value in profile:
+			self.pragma(name, value)
+	
 	
 	# EXEC
 	def execute(self, *args):
@@ -296,6 +443,65 @@ class Database(object):
 			))
 	
 	
+	# STREAM
+	def stream(self, sql, args=None, chunk=None, row=None, adapt=True):
+		"""
+		Generator; execute `sql` with optional `args` and yield result
+		rows, fetched with fetchmany() so that results larger than
+		memory can be consumed a piece at a time. On error, rollback.
+		
+		 - chunk: rows per fetch (default DB_STREAM_CHUNK). If `adapt` is
+		          True, the chunk is doubled while fetches take less than
+		          half of DB_STREAM_TARGET seconds and halved while they
+		          take more than twice that, within DB_STREAM_MIN and
+		          DB_STREAM_MAX.
+		 - row  : None (rows as the module returns them), 'dict', 
+		          'record' (a slotted namedtuple with attributes named
+		          for the columns), or a callable that's given each row
+		          and returns the item to yield.
+		
+		Rows are fetched with a new cursor, so other queries may run
+		while the stream is consumed; eg, pipe results into a query or
+		a csv writer:
+		
+		q = pdq.Query(lambda: db.stream(sql), lazy=True)
+		Base.ncreate('fs.csv.CSVWriter', f).write(db.stream(sql))
+		"""
+		c = self.cursor()
+		try:
+			if args is None:
+				c.execute(sql)
+			else:
+				c.execute(sql, args)
+		except Exception as ex:
+			c.close()
+			if not self.active:
+				raise Exception('db-inactive', self.xdata())
+			self.__rollback()
+			raise Exception('db-query-err', self.xdata(sql=sql))
+		
+		try:
+			fn = dbrowtype(row, c.description)
+			n = chunk or DB_STREAM_CHUNK
+			while True:
+				t = time.time()
+				rows = c.fetchmany(n)
+				if not rows:
+					break
+				if adapt:
+					t = time.time() - t
+					if t < DB_STREAM_TARGET / 2:
+						n = min(n * 2, DB_STREAM_MAX)
+					elif t > DB_STREAM_TARGET * 2:
+						n = max(n // 2, DB_STREAM_MIN)
+				if fn:
+					rows = [fn(r) for r in rows]
+				for r in rows:
+					yield r
+		finally:
+			c.close()
+	
+	
 	# OPQ - Op Query
 	def opq (self, qname, *args):
 		"""
@@ -303,7 +509,44 @@ class Database(object):
 		any arguments required by the query; Executes the query and 
 		returns a cursor.
 		"""
-		return self.query(self.__op[qname], *args)
+		st = self.statement(qname)
+		return self.__opexec(st, st.sql, *args)
+	
+	
+	# OPMANY - Op Query, executemany
+	def opmany(self, qname, rows, chunk=None):
+		"""
+		Execute op `qname` once for each item in iterable `rows`. Rows 
+		are passed to executemany in lists of `chunk` items (default
+		DB_CHUNK) so that large iterables (or generators) are streamed
+		rather than loaded into memory. Returns the number of rows.
+		On error, rollback.
+		
+		Each op keeps one cursor for its executemany calls; since they
+		return no rows, reusing it never leaves a result set open.
+		"""
+		st = self.statement(qname)
+		chunk = chunk or DB_CHUNK
+		rows = iter(rows)
+		n = 0
+		while True:
+			block = list(itertools.islice(rows, chunk))
+			if not block:
+				return n
+			t = time.time()
+			try:
+				if st.cursor is None:
+					st.cursor = self.cursor()
+				st.cursor.executemany(st.sql, block)
+			except Exception as ex:
+				if not self.active:
+					raise Exception('db-inactive', self.xdata())
+				self.__rollback()
+				raise Exception('db-query-err', self.xdata(sql=st.sql, 
+					op=qname, python=str(ex), row=n
+				))
+			st.record(time.time()-t, len(block))
+			n += len(block)
 	
 	
 	# OPS - Op Query List
@@ -314,19 +557,66 @@ class Database(object):
 		On error, rollback.
 		"""
 		try:
-			xq = len(self.__op[qname])
+			st = self.statement(qname)
 			xa = len(args)
-			xsql = self.__op[qname]
-			for i in range(0, xq):
-				sql = xsql[i]
+			for i, sql in enumerate(st.sql):
 				if (i<xa) and (args[i]):
-					self.query(sql, args[i])
+					self.__opexec(st, sql, args[i])
 				else:
-					self.query(sql)
+					self.__opexec(st, sql)
 		except:
 			raise Exception(self.xdata())
 	
 	
+	# STATEMENT
+	def statement(self, qname):
+		"""
+		Return the Statement for op `qname`, creating it as needed.
+		"""
+		try:
+			return self.__stmt[qname]
+		except KeyError:
+			st = self.__stmt[qname] = Statement(qname, self.__op[qname])
+			return st
+	
+	
+	# OP STATS
+	def opstats(self, qname=None, reset=False):
+		"""
+		Return a dict of call statistics keyed by op name, or just the
+		stats for op `qname`. Each stats dict contains:
+		 - calls: number of execute/executemany calls
+		 - rows : number of rows passed (one per opq call)
+		 - total: total seconds spent; 'mean' and 'max' are per call
+		 - hist : list of [bound, count] pairs - the number of calls 
+		          taking no more than `bound` seconds (and more than the
+		          previous bound); the last bound is None (no limit).
+		If `reset` is True, counters are zeroed after they're read.
+		"""
+		names = [qname] if qname else list(self.__stmt.keys())
+		r = {}
+		for name in names:
+			st = self.statement(name)
+			r[name] = st.stats()
+			if reset:
+				st.reset()
+		return r[qname] if qname else r
+	
+	
+	# OP-EXEC
+	def __opexec(self, st, sql, *args):
+		t = time.time()
+		try:
+			c = self.execute(sql, *args)
+		except Exception as ex:
+			if not self.active:
+				raise Exception('db-inactive', self.xdata())
+			self.__rollback()
+			raise Exception('db-query-err', self.xdata(sql=sql, op=st.name))
+		st.record(time.time()-t)
+		return c
+	
+	
 	def xdata(self, **k):
 		"""Return a dict containing debug information."""
 		d = dict(module=self.__modname, active=self.active)
@@ -335,3 +625,622 @@ class Database(object):
 		
 		# this is the pyro __init__ xdata() function
 		return xdata(d, **k)
+
+
+
+
+
+#
+# ROW TYPES
+#
+def dbrowtype(row, description):
+	"""
+	Return a function converting the rows of a cursor with the given
+	`description` to `row` type (see Database.stream), or None if rows
+	need no conversion.
+	"""
+	if row is None or row == 'tuple':
+		return None
+	if callable(row):
+		return row
+	names = [d[0] for d in (description or [])]
+	if row == 'dict':
+		return lambda r: dict(zip(names, r))
+	elif row == 'record':
+		return collections.namedtuple('Record', names, rename=True)._make
+	raise ValueError('db-row-invalid', xdata(row=row, 
+		valid=['tuple', 'dict', 'record', 'callable']
+	))
+
+
+
+
+
+#
+# STATEMENT
+#
+class Statement(object):
+	"""
+	The sql for one named op, the cursor opmany() reuses for it, and 
+	counters for the op's calls and latencies.
+	"""
+	
+	__slots__ = ['name', 'sql', 'cursor', 'calls', 'rows', 'total', 'max',
+		'hist']
+	
+	def __init__(self, name, sql):
+		self.name = name
+		self.sql = sql
+		self.cursor = None
+		self.reset()
+	
+	def reset(self):
+		"""Zero the counters."""
+		self.calls = self.rows = 0
+		self.total = self.max = 0.0
+		self.hist = [0] * (len(DB_HIST) + 1)
+	
+	def record(self, t, rows=1):
+		"""Count one call taking `t` seconds for `rows` rows."""
+		self.calls += 1
+		self.rows += rows
+		self.total += t
+		if t > self.max:
+			self.max = t
+		self.hist[bisect.bisect_left(DB_HIST, t)] += 1
+	
+	def stats(self):
+		"""Return a dict of counters; see Database.opstats()."""
+		return dict(calls=self.calls, rows=self.rows, total=self.total,
+			mean=self.total/self.calls if self.calls else 0.0, max=self.max,
+			hist=[[b, n] for b, n in zip(list(DB_HIST) + [None], self.hist)]
+		)
+
+
+
+
+
+#
+# DATABASE POOL
+#
+
+# pool defaults; see DatabasePool
+DBPOOL_SIZE = 8
+DBPOOL_TIMEOUT = 30
+DBPOOL_IDLE = 300
+DBPOOL_CHECK = "select 1"
+
+
+class DatabasePool(object):
+	"""
+	A pool of open Database objects, all created from the same config.
+	
+	Check a database out, use it, and check it back in; the `database`
+	context manager does this for you. Or call local() to get a database
+	for the calling thread's exclusive use until it calls release().
+	
+	pool = DatabasePool("~/data/my.db.conf", maxsize=4)
+	with pool.database() as db:
+		db.opq('some-op', (x,))
+	"""
+	
+	def __init__(self, config=None, *a, **k):
+		"""
+		Arguments are those of the Database constructor, plus optional
+		pool kwargs:
+		 - maxsize: the maximum number of open databases (checked out or
+		            idle); default DBPOOL_SIZE
+		 - timeout: seconds checkout() waits for a database to become 
+		            available; default DBPOOL_TIMEOUT
+		 - idle   : seconds an idle database stays open; DBPOOL_IDLE
+		 - check  : sql executed to make sure an idle database is still
+		            usable before it's checked out; DBPOOL_CHECK (None
+		            to skip checks)
+		
+		NOTE: For sqlite3, connections are opened with kwarg 
+		      check_same_thread=False, since they may be used by more
+		      than one thread (though never at the same time).
+		"""
+		self.maxsize = k.pop('maxsize', DBPOOL_SIZE)
+		self.timeout = k.pop('timeout', DBPOOL_TIMEOUT)
+		self.idle = k.pop('idle', DBPOOL_IDLE)
+		self.check = k.pop('check', DBPOOL_CHECK)
+		
+		self.__config = (config, a, k)
+		self.__cond = threading.Condition(threading.Lock())
+		self.__idle = []   # [(database, time checked in), ...]
+		self.__used = set()
+		self.__local = threading.local()
+		self.__threads = {} # thread: database, for local()
+		self.__closed = False
+		self.__stats = dict(created=0, checkouts=0, waits=0, timeouts=0,
+			discarded=0
+		)
+	
+	def __del__(self):
+		try:
+			self.close()
+		except:
+			pass
+	
+	@property
+	def size(self):
+		"""Number of open databases, both checked out and idle."""
+		return len(self.__used) + len(self.__idle)
+	
+	def stats(self):
+		"""Return a dict with pool counters and current sizes."""
+		with self.__cond:
+			return dict(self.__stats, maxsize=self.maxsize, 
+				inuse=len(self.__used), idle=len(self.__idle)
+			)
+	
+	
+	# CHECKOUT
+	def checkout(self, timeout=None):
+		"""
+		Return an open Database for the caller's exclusive use. Waits up
+		to `timeout` seconds (default: self.timeout) if `maxsize` 
+		databases are already checked out.
+		"""
+		timeout = self.timeout if timeout is None else timeout
+		end = time.time() + timeout
+		
+		# Opening and checking databases can be slow, so it's done after
+		# the lock is released; the slot is reserved in __used meanwhile.
+		while True:
+			with self.__cond:
+				db, t = self.__reserve(timeout, end)
+			
+			if t is None:
+				# `db` is a placeholder; open a new database in its slot
+				try:
+					newdb = self.__open()
+				except:
+					with self.__cond:
+						self.__used.discard(db)
+						self.__cond.notify()
+					raise
+				with self.__cond:
+					self.__used.discard(db)
+					self.__stats['created'] += 1
+					return self.__lend(newdb)
+			
+			elif self.__healthy(db, t):
+				with self.__cond:
+					return self.__lend(db)
+			
+			else:
+				with self.__cond:
+					self.__used.discard(db)
+					self.__discard(db)
+					self.__cond.notify()
+	
+	
+	# CHECKIN
+	def checkin(self, db):
+		"""
+		Return a checked-out database to the pool. Uncommitted changes
+		are rolled back, so commit before checking a database in.
+		"""
+		with self.__cond:
+			self.__checkin(db)
+	
+	
+	# DATABASE
+	@contextlib.contextmanager
+	def database(self, timeout=None):
+		"""
+		Context manager; checks out a database and checks it back in 
+		when the block ends. Changes are committed if the block ends
+		normally, or rolled back if it raises an exception.
+		"""
+		db = self.checkout(timeout)
+		try:
+			yield db
+			db.commit()
+		except:
+			try:
+				db.rollback()
+			except:
+				pass
+			raise
+		finally:
+			self.checkin(db)
+	
+	
+	# LOCAL
+	def local(self):
+		"""
+		Return the calling thread's database, checking one out the first
+		time it's requested. The thread should call release() when it's 
+		finished; if it exits without doing so, the database is reclaimed
+		the next time the pool needs one.
+		"""
+		try:
+			return self.__local.db
+		except AttributeError:
+			db = self.__local.db = self.checkout()
+			with self.__cond:
+				self.__threads[threading.current_thread()] = db
+			return db
+	
+	def release(self):
+		"""Check in the calling thread's local() database, if any."""
+		db = getattr(self.__local, 'db', None)
+		if db is not None:
+			del(self.__local.db)
+			with self.__cond:
+				self.__threads.pop(threading.current_thread(), None)
+				self.__checkin(db)
+	
+	
+	# PRUNE
+	def prune(self):
+		"""Close idle databases that have timed out; Returns the count."""
+		with self.__cond:
+			keep = []
+			n = 0
+			for db, t in self.__idle:
+				if self.idle and (time.time() - t > self.idle):
+					self.__discard(db)
+					n += 1
+				else:
+					keep.append((db, t))
+			self.__idle = keep
+			return n
+	
+	
+	# CLOSE
+	def close(self):
+		"""
+		Close idle databases and stop lending; databases checked out now
+		are closed when they're checked in.
+		"""
+		with self.__cond:
+			self.__closed = True
+			for db, t in self.__idle:
+				db.close()
+			self.__idle = []
+			self.__cond.notify_all()
+	
+	
+	#
+	# INTERNAL - the caller must hold the lock, except for __open()
+	#            and __healthy(), which are called without it.
+	#
+	def __reserve(self, timeout, end):
+		# Take an idle database, or reserve a slot for a new one, moving
+		# it into __used; Returns (db, checkin time) or (placeholder,
+		# None). Waits up to `end` for a checkin if the pool is full.
+		while True:
+			if self.__closed:
+				raise Exception('db-pool-closed', xdata())
+			
+			# reuse an idle database, newest first
+			if self.__idle:
+				db, t = self.__idle.pop()
+				self.__used.add(db)
+				return db, t
+			
+			# reclaim databases of threads that exited without release
+			self.__reclaim()
+			if self.__idle:
+				continue
+			
+			# reserve a slot for a new database
+			if self.size < self.maxsize:
+				slot = object()
+				self.__used.add(slot)
+				return slot, None
+			
+			# wait for a checkin
+			wait = end - time.time()
+			if wait <= 0:
+				self.__stats['timeouts'] += 1
+				raise Exception('db-pool-timeout', xdata(
+					timeout=timeout, maxsize=self.maxsize
+				))
+			self.__stats['waits'] += 1
+			self.__cond.wait(wait)
+	
+	def __open(self):
+		config, a, k = self.__config
+		if isinstance(config, dict):
+			config = dict(config, args=list(config.get('args', [])))
+		db = Database(config, *a, **k)
+		kwargs = dict(check_same_thread=False) if (
+			db.modname == 'sqlite3') else {}
+		return db.open(**kwargs)
+	
+	def __lend(self, db):
+		self.__used.add(db)
+		self.__stats['checkouts'] += 1
+		return db
+	
+	def __checkin(self, db):
+		if db not in self.__used:
+			raise ValueError('db-pool-checkin', xdata(
+				reason='not-checked-out'
+			))
+		self.__used.discard(db)
+		if self.__closed or not db.active:
+			db.close()
+		else:
+			# end any open transaction before the database is reused
+			try:
+				db.rollback()
+				self.__idle.append((db, time.time()))
+			except Exception:
+				self.__discard(db)
+		self.__cond.notify()
+	
+	def __discard(self, db):
+		self.__stats['discarded'] += 1
+		try:
+			db.close()
+		except:
+			pass
+	
+	def __healthy(self, db, t):
+		if self.idle and (time.time() - t > self.idle):
+			return False
+		if not db.active:
+			return False
+		if self.check:
+			try:
+				db.execute(self.check).fetchall()
+			except Exception:
+				return False
+		return True
+	
+	def __reclaim(self):
+		for th in list(self.__threads.keys()):
+			if not th.is_alive():
+				db = self.__threads.pop(th)
+				self.__checkin(db)
+
+
+
+
+
+
+#
+# ASYNC DATABASE
+#
+
+# async defaults; see AsyncDatabase
+DBASYNC_QUEUE = 64
+DBASYNC_TIMEOUT = 30
+DBASYNC_RETRY = 0.01
+
+
+class AsyncDatabase(object):
+	"""
+	Runs a Database on a dedicated worker thread. Calls are queued and
+	executed in order; each returns a concurrent.futures.Future (the 
+	f-prefixed methods) or an asyncio-awaitable future (the others).
+	Results are read in the worker thread, so queries return lists of
+	rows rather than cursors. Call close() when done; the worker thread
+	keeps this object alive until then.
+	
+	adb = AsyncDatabase("~/data/my.db.conf")
+	f = adb.fopq('some-op', (x,))   # poll f.done() from an io loop
+	rows = await adb.opq('some-op', (x,))  # or, in a coroutine
+	
+	The queue holds at most `maxqueue` calls. When it's full, f-method
+	calls block for up to `timeout` seconds, then raise 'db-async-full'
+	(pass timeout=0 to fail immediately). Awaitable calls never block
+	the event loop; they're retried every DBASYNC_RETRY seconds until
+	there's room.
+	"""
+	
+	def __init__(self, config=None, *a, **k):
+		"""
+		Arguments are those of the Database constructor, plus optional
+		kwargs `maxqueue` (default DBASYNC_QUEUE) and `timeout` (default
+		DBASYNC_TIMEOUT; None to wait forever). The database is opened
+		in the worker thread; errors opening it are raised here.
+		"""
+		if Future is None:
+			raise ImportError('db-async-unavailable', xdata(
+				reason='module-required', module='concurrent.futures'
+			))
+		
+		self.timeout = k.pop('timeout', DBASYNC_TIMEOUT)
+		self.maxqueue = k.pop('maxqueue', DBASYNC_QUEUE)
+		
+		# the queue itself is unbounded; `__count` (guarded by `__cond`)
+		# limits it to maxqueue calls, so that the closed check and the
+		# put can't be split by close()
+		self.__queue = queue.Queue()
+		self.__cond = threading.Condition()
+		self.__count = 0
+		self.__closed = False
+		self.__db = None
+		
+		opened = Future()
+		self.__thread = threading.Thread(target=self.__work, 
+			args=(opened, config, a, k)
+		)
+		self.__thread.daemon = True
+		self.__thread.start()
+		opened.result()
+	
+	@property
+	def active(self):
+		return not self.__closed
+	
+	@property
+	def db(self):
+		"""
+		The Database. Use it only in callables passed to fcall/call,
+		which run in the worker thread.
+		"""
+		return self.__db
+	
+	@property
+	def pending(self):
+		"""Number of queued calls."""
+		return self.__count
+	
+	
+	# FUTURES
+	def fcall(self, fn, *args):
+		"""
+		Queue a call to `fn(db, *args)`, where db is the Database, and
+		return a Future for its result.
+		"""
+		f = Future()
+		if not self.__put((f, fn, args), self.timeout):
+			raise Exception('db-async-full', xdata(
+				timeout=self.timeout, maxqueue=self.maxqueue
+			))
+		return f
+	
+	def fquery(self, sql, *args):
+		"""Future for the rows of Database.query(sql, *args)."""
+		return self.fcall(adbrows, 'query', sql, *args)
+	
+	def fopq(self, qname, *args):
+		"""Future for the rows of Database.opq(qname, *args)."""
+		return self.fcall(adbrows, 'opq', qname, *args)
+	
+	def fqmany(self, sql, *args):
+		"""Future for the rowcount of Database.qmany(sql, *args)."""
+		return self.fcall(adbcount, 'qmany', sql, *args)
+	
+	def fcommit(self):
+		"""Future for Database.commit()."""
+		return self.fcall(adbcommit)
+	
+	
+	# AWAITABLES
+	def call(self, fn, *args):
+		"""Awaitable fcall(); call it from a coroutine."""
+		import asyncio
+		try:
+			loop = asyncio.get_running_loop()
+		except AttributeError:
+			loop = asyncio.get_event_loop() # python < 3.7
+		af = loop.create_future()
+		
+		def done(f):
+			if af.cancelled():
+				return
+			if f.cancelled():
+				af.cancel()
+			elif f.exception() is not None:
+				af.set_exception(f.exception())
+			else:
+				af.set_result(f.result())
+		
+		def put():
+			if af.cancelled():
+				return
+			f = Future()
+			try:
+				if not self.__put((f, fn, args), 0):
+					loop.call_later(DBASYNC_RETRY, put)
+					return
+			except Exception as ex:
+				af.set_exception(ex)
+			else:
+				af.add_done_callback(lambda x: x.cancelled() and f.cancel())
+				f.add_done_callback(
+					lambda f: loop.call_soon_threadsafe(done, f)
+				)
+		
+		put()
+		return af
+	
+	def query(self, sql, *args):
+		"""Awaitable fquery()."""
+		return self.call(adbrows, 'query', sql, *args)
+	
+	def opq(self, qname, *args):
+		"""Awaitable fopq()."""
+		return self.call(adbrows, 'opq', qname, *args)
+	
+	def qmany(self, sql, *args):
+		"""Awaitable fqmany()."""
+		return self.call(adbcount, 'qmany', sql, *args)
+	
+	def commit(self):
+		"""Awaitable fcommit()."""
+		return self.call(adbcommit)
+	
+	
+	# CLOSE
+	def close(self, wait=True):
+		"""
+		Stop accepting calls. Calls already queued are run, then the
+		database is closed. If `wait` is True, block until then.
+		"""
+		with self.__cond:
+			if not self.__closed:
+				self.__closed = True
+				self.__queue.put(None)
+				self.__cond.notify_all()
+		if wait and (self.__thread is not threading.current_thread()):
+			self.__thread.join()
+	
+	
+	def __put(self, item, timeout):
+		# queue a call; returns False if the queue is still full after
+		# `timeout` seconds
+		end = None if timeout is None else time.time() + timeout
+		with self.__cond:
+			while not self.__closed and self.__count >= self.maxqueue:
+				wait = None if end is None else end - time.time()
+				if (wait is not None) and (wait <= 0):
+					return False
+				self.__cond.wait(wait)
+			if self.__closed:
+				raise Exception('db-async-closed', xdata())
+			self.__count += 1
+			self.__queue.put(item)
+			return True
+	
+	def __work(self, opened, config, a, k):
+		# worker thread; the database is used only here
+		try:
+			self.__db = Database(config, *a, **k).open()
+		except BaseException as ex:
+			with self.__cond:
+				self.__closed = True
+			opened.set_exception(ex)
+			return
+		opened.set_result(True)
+		
+		try:
+			while True:
+				item = self.__queue.get()
+				if item is None:
+					break
+				with self.__cond:
+					self.__count -= 1
+					self.__cond.notify()
+				f, fn, args = item
+				if f.set_running_or_notify_cancel():
+					try:
+						f.set_result(fn(self.__db, *args))
+					except BaseException as ex:
+						f.set_exception(ex)
+		finally:
+			self.__db.close()
+
+
+
+# worker-thread calls for AsyncDatabase
+def adbrows(db, method, *args):
+	"""Call Database `method`; return all rows."""
+	return getattr(db, method)(*args).fetchall()
+
+def adbcount(db, method, *args):
+	"""Call Database `method`; return the cursor's rowcount."""
+	return getattr(db, method)(*args).rowcount
+
+def adbcommit(db):
+	"""Commit."""
+	db.commit()
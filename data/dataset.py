@@ -23,11 +23,20 @@ A dataset database has a table for each of these ideas (dataset, tag,
 etc...). Any field containing an already-existing data item points to
 that item, rather than creating a copy. This saves a lot of storage
 space if many fields contain the same larger-than-an-int data value.
+
+The 'typed' engine (see TypedDataset) stores each field's value with
+its type instead - integers, reals, text, or blobs - in a single table
+keyed by record and tag. It's smaller and faster for numeric series,
+and its tag columns can be packed into compressed blocks.
+
+ds = Datasets("~/data/my.db", engine='typed')
 """
 
 from .. import *
 #import time #included from ..
 
+import heapq, itertools, zlib
+
 
 # import as 'thread' from python 2 or 3
 try:
@@ -35,6 +44,23 @@ try:
 except:
 	import _thread as thread
 
+try:
+	import cPickle as pickle
+except:
+	import pickle
+
+
+# records added per transaction by Dataset.addmany()
+DATASET_BATCH = 1000
+
+# default maximum number of tag and data ids cached by Datasets
+DATASET_CACHE_SIZE = 65536
+
+# default storage engine; see DATASET_ENGINES
+DATASET_ENGINE = 'eav'
+
+# values per compressed block in TypedDataset.pack()
+DATASET_BLOCK = 4096
 
 
 
@@ -57,7 +83,25 @@ class Datasets (Base):
 		All args and kwargs will be applied to creating a database, but 
 		only if the db argument is NOT a database.Database object. If the
 		`db` argument is a Database object, kwargs are ignored.
+		
+		The exceptions are kwargs:
+		 - cachesize: the maximum number of tag and data ids to cache 
+		              (default: DATASET_CACHE_SIZE; None for no limit). 
+		              The cache is shared by all Dataset objects created 
+		              by dset(); see the `cache` property.
+		 - engine   : the storage engine, 'eav' or 'typed' (see the 
+		              DATASET_ENGINES dict); it may also be given as the
+		              'engine' key of the database config. Default:
+		              DATASET_ENGINE
+		 - migrate  : if True, a typed-engine database that still holds
+		              'eav' fields is migrated; see migrate()
 		"""
+		# id cache and lock, shared by this database's datasets
+		self.__cache = IdCache(k.pop('cachesize', DATASET_CACHE_SIZE))
+		self.__lock = thread.allocate_lock()
+		engine = k.pop('engine', None)
+		migrate = k.pop('migrate', False)
+		
 		try:
 			# First, assume db is a Database object; make sure it's open.
 			if not db.active:
@@ -71,6 +115,31 @@ class Datasets (Base):
 		
 		# private vars
 		self.__db = db
+		
+		# storage engine
+		self.__engine = engine or db.config().get('engine') or DATASET_ENGINE
+		try:
+			spec = DATASET_ENGINES[self.__engine]
+		except KeyError:
+			raise ValueError('dataset-engine-invalid', xdata(
+				engine=self.__engine, valid=sorted(DATASET_ENGINES.keys())
+			))
+		for op in spec['ops']:
+			if op not in db.sop:
+				raise ValueError('dataset-engine-invalid', xdata(
+					engine=self.__engine, reason='op-required', op=op
+				))
+		if spec['create']:
+			db.qlist(spec['create'])
+			db.commit()
+		
+		# a typed database must not hold eav fields
+		if (self.__engine == 'typed') and self.__eavfields():
+			if not migrate:
+				raise Exception('dataset-migrate-required', xdata(
+					engine=self.__engine, detail='pass migrate=True'
+				))
+			self.migrate()
 			
 	def __del__(self):
 		self.__db.close()
@@ -80,14 +149,75 @@ class Datasets (Base):
 	def db(self):
 		return self.__db
 	
+	@property
+	def engine(self):
+		"""The storage engine name."""
+		return self.__engine
+	
+	@property
+	def cache(self):
+		"""
+		The IdCache mapping tag and data values to their ids. Call its
+		stats() method for hit counts and hit rate; set its `size` to 
+		change the limit.
+		"""
+		return self.__cache
+	
 	def dset(self, setname):
 		"""
 		Returns a Dataset object representing a named dataset from this
 		`Datasets` database.
 		"""
 		# Pass the Database object and the name of the dataset stored
-		# within that database.
-		return Dataset(self.db, setname)
+		# within that database, plus the shared cache and lock.
+		T = DATASET_ENGINES[self.__engine]['type']
+		return T(self.db, setname, cache=self.__cache, lock=self.__lock)
+	
+	def rollback(self):
+		"""
+		Roll back the database and clear the id cache. Use this rather
+		than self.db.rollback() if tags or data may have been added
+		outside of Dataset.add() since the last commit.
+		"""
+		try:
+			self.db.rollback()
+		finally:
+			self.__cache.invalidate()
+	
+	def migrate(self, batch=DATASET_BATCH):
+		"""
+		Move all 'eav' fields (of every dataset) into typed storage, then
+		remove them (and their data) from the field and data tables; 
+		Returns the number of values moved. This database's engine must
+		be 'typed'.
+		
+		The eav engine stores values as text, so text that's the exact
+		representation of an integer or real (eg, '12', '-0.5', but not
+		'012' or '1e3') becomes a number; see typedvalue().
+		"""
+		if self.__engine != 'typed':
+			raise ValueError('dataset-migrate-invalid', xdata(
+				engine=self.__engine, reason='typed-engine-required'
+			))
+		db = self.db
+		with self.__lock:
+			try:
+				rows = db.stream(DATASET_MIGRATE_SQL, None, batch)
+				n = db.opmany('tval-add', (
+						(r[0], r[1], typedvalue(r[2])) for r in rows
+					), batch
+				)
+				db.query("delete from field")
+				db.query("delete from data")
+				db.commit()
+			except Exception:
+				self.rollback()
+				raise
+			self.__cache.invalidate()
+		return n
+	
+	def __eavfields(self):
+		return self.db.query("select 1 from field limit 1").fetchone()
 
 
 
@@ -95,11 +225,25 @@ class Datasets (Base):
 
 class Dataset (object):
 	
-	def __init__(self, db, setname):
-		
+	# storage engine; see DATASET_ENGINES
+	engine = 'eav'
+	
+	def __init__(self, db, setname, **k):
+		"""
+		Pass a data.database.Database and the name of a dataset. Kwargs
+		`cache` (an IdCache) and `lock` are given by Datasets.dset() so
+		that datasets of the same database share them; otherwise, this
+		dataset gets its own.
+		"""
 		# set "db" first so the self.db calls below will work
 		self.__db = db
 		
+		# tag/data id cache and add() lock
+		self.__cache = k.get('cache')
+		if self.__cache is None:
+			self.__cache = IdCache(DATASET_CACHE_SIZE)
+		self.__lock = k.get('lock') or thread.allocate_lock()
+		
 		# store the set name; create the set if it doesn't 
 		# already exist; get and store the set id.
 		self.__setname = setname
@@ -134,6 +278,11 @@ class Dataset (object):
 		"""The set identifier, an integer."""
 		return self.__setid
 	
+	@property
+	def lock(self):
+		"""The lock held while records are added."""
+		return self.__lock
+	
 	# COUNT
 	def count (self):
 		"""Record count for this object's dataset."""
@@ -142,73 +291,482 @@ class Dataset (object):
 	
 	
 	def search(self, tag, data, order='dt'):
-		"""Return a cursor where tag matches data."""
-		return self.db.opq("search-data", (self.setid, tag, data, order))
+		"""
+		Return a cursor where tag matches data (as sql `like`). Argument
+		`order` names a result column (dt, setname, setid, recid, tag,
+		tagid, data, and - for the eav engine - dataid), prefixed with '-'
+		for descending order.
+		"""
+		spec = DATASET_ENGINES[self.engine]
+		cols = spec['search-cols']
+		name, desc = (order[1:], True) if order[:1] == '-' else (order, False)
+		if name not in cols:
+			raise ValueError('dataset-order-invalid', xdata(order=order,
+				valid=sorted(cols.keys())
+			))
+		sql = "%s order by %s%s" % (self.db.sop[spec['search']], 
+			cols[name], ' desc' if desc else ''
+		)
+		return self.db.query(sql, (self.setid, tag, data))
+	
+	
+	def records(self, where=None, order='recid', limit=None, after=None):
+		"""
+		Generator; yields a Record (a dict of tag: data) for each record
+		in this dataset, assembled from a single query whose results are
+		streamed (see Database.stream), starting DATASET_FETCH rows at a
+		time.
+		
+		 - where: a dict; only records with a field for each tag whose
+		          data equals the given value are included
+		 - order: 'recid', 'dt', or the name of a tag whose data orders
+		          records (records without that tag come first); prefix
+		          with '-' for descending order
+		 - limit: the maximum number of records to yield
+		 - after: for keyset pagination, the last Record of the previous
+		          page (or its `key`); only records after it are given
+		
+		# EXAMPLE: pages of 100 records
+		page = list(ds.records(order='-dt', limit=100))
+		while page:
+			print (page)
+			page = list(ds.records(order='-dt', limit=100, after=page[-1]))
+		"""
+		spec = DATASET_ENGINES[self.engine]
+		name, desc = (order[1:], True) if order[:1] == '-' else (order, False)
+		direction = 'desc' if desc else 'asc'
+		args = []
+		
+		# order key: a record column, or the (first) data of a tag
+		if name in ('recid', 'dt'):
+			okey = 'r.%s' % name
+		else:
+			okey = spec['records-tagkey']
+			args.append(name)
+		
+		# conditions
+		conds = ['r.setid=?']
+		args.append(self.setid)
+		for tag in sorted(where or {}):
+			conds.append(spec['records-where'])
+			args.extend([tag, where[tag]])
+		
+		# keyset
+		keyset = '1'
+		if after is not None:
+			ak, arec = after.key if isinstance(after, Record) else after
+			op = '<' if desc else '>'
+			keyset = "(ok %s ? or (ok = ? and recid %s ?))" % (op, op)
+			args.extend([ak, ak, arec])
+		
+		if limit is not None:
+			args.append(int(limit))
+		
+		sql = spec['records'] % dict(okey=okey, conds=' and '.join(conds),
+			keyset=keyset, dir=direction, 
+			limit='limit ?' if limit is not None else ''
+		)
+		
+		rows = self.db.stream(sql, args, DATASET_FETCH)
+		for recid, rr in itertools.groupby(rows, lambda r: r[0]):
+			rec = None
+			for r in rr:
+				if rec is None:
+					rec = Record(recid, r[1], r[2])
+				if r[3] is not None:
+					rec[r[3]] = r[4]
+			yield rec
 	
 	
 	def add(self, iterable=None, **k):
 		"""
-		Create new record
-		Select new record's ID
-		Loop through kwargs adding tag=data
-		 - add/get tagid
-		 - add/get dataid
-		 - add field holding new recid/tagid
+		Add a record whose fields are given as keyword args: tag=data.
+		If `iterable` is given, a record is added for each of its dicts
+		instead (see addmany()).
 		
 		NOTE: If tag already exists, the tagid
-		      is returned. If the data already
-		      exists, it's dataid is returned.
-		
-		NEW FEATURE:
-		Since transactions are so slow, there's now an optional 
-		`iterable` argument that, when given, loops adding all records
-		before committing.
+		      is used. If the data already
+		      exists, it's dataid is used.
 		"""
 		# accept a list of dicts or just keyword args
-		dicts = iterable or [k]
+		self.addmany(iterable or [k])
+	
+	
+	def addmany(self, iterable, batch=DATASET_BATCH):
+		"""
+		Add a record for each dict in `iterable`; Returns the number of
+		records added.
+		
+		Records are added in transactions of `batch` records. Tag and
+		data ids come from the id cache when possible, record ids come
+		from the cursor's lastrowid, and each batch's fields are added 
+		with a single executemany. If a batch fails, it's rolled back and
+		the exception is raised; records from earlier batches remain.
 		
+		Ids of tags and data added by a batch are cached only after the
+		batch is committed, so a rollback never leaves them in the cache.
+		"""
+		n = 0
+		it = iter(iterable)
+		while True:
+			dicts = list(itertools.islice(it, batch))
+			if not dicts:
+				return n
+			with self.__lock:
+				pending = {}
+				try:
+					self._addbatch(dicts, pending)
+					self.db.commit()
+				except Exception:
+					try:
+						self.db.rollback()
+					except:
+						pass
+					raise
+				for key in pending:
+					self.__cache.put(key, pending[key])
+			n += len(dicts)
+	
+	
+	def _addbatch(self, dicts, pending):
+		# Add records for a list of dicts; the caller commits. Ids of 
+		# values added are stored in `pending` until then.
+		fields = []
 		for d in dicts:
-			with thread.allocate_lock():
-				self.db.opq('rec-add', (self.setid, time.time()))
-				c = self.db.opq('rec-max', (self.setid,))
-				recid=c.fetchone()[0]
-				
-				for kw in d:
-					tagid = self.__tagAdd(kw)
-					dataid = self.__dataAdd(d[kw])
-					self.db.opq("field-add", (recid, tagid, dataid))
-				
-			self.db.commit()
+			recid = self._insert('rec-add', (self.setid, time.time()),
+				'rec-max', (self.setid,)
+			)
+			for tag in d:
+				data = d[tag]
+				fields.append((recid, 
+					self._id(('tag', tag), tag, 'tag', pending),
+					self._id(('data', type(data), data), data, 'data', pending)
+				))
+		self.db.opmany('field-add', fields, len(fields))
 	
-	def __add(self, **k):
-		with thread.allocate_lock():
-			self.db.opq('rec-add', (self.setid, time.time()))
-			c=self.db.opq('rec-max', (self.setid,))
-			recid=c.fetchone()[0]
-			
-			for kw in k:
-				tagid = self.__tagAdd(kw)
-				dataid = self.__dataAdd(k[kw])
-				self.db.opq("field-add", (recid, tagid, dataid))
+	
+	def _insert(self, op, args, findop, findargs):
+		# Run insert `op`; Returns the new row's id. Modules that don't
+		# give a lastrowid get it from `findop`.
+		rowid = self.db.opq(op, args).lastrowid
+		if rowid is None:
+			rowid = self.db.opq(findop, findargs).fetchone()[0]
+		return rowid
+	
+	
+	def _id(self, key, value, table, pending):
+		# Return the id of `value` in `table` ('tag' or 'data'), adding
+		# it if necessary. Data keys include the type since (eg) 1 == 1.0
+		# but they're stored as different text.
+		x = pending.get(key)
+		if x is None:
+			x = self.__cache.get(key)
+		if x is None:
+			find = '%s-find' % table
+			r = self.db.opq(find, (value,)).fetchone()
+			if r:
+				x = r[0]
+				self.__cache.put(key, x)
+			else:
+				x = pending[key] = self._insert(
+					'%s-add' % table, (value,), find, (value,)
+				)
+		return x
+
+
+
+
+
+#
+# TYPED DATASET
+#
+class TypedDataset (Dataset):
+	"""
+	A Dataset stored by the 'typed' engine. Each field is a row of the
+	`tval` table - (recid, tagid, v) - where v keeps the value's type:
+	integer, real, text, or blob (bytes). There's no data table, so
+	adding a record needs no data lookups and reading one needs no 
+	data join.
+	
+	A tag's values can be packed into zlib-compressed blocks of up to
+	DATASET_BLOCK values each (see pack()). Packed values are still
+	returned by records() and column(), but packed tags can't be used
+	by search() or by the `where` or `order` arguments of records()
+	until they're unpacked. Values added to a tag after it's packed
+	are stored in tval until the tag is packed again.
+	"""
+	
+	engine = 'typed'
+	
+	def search(self, tag, data, order='dt'):
+		"""
+		Return a cursor where tag matches data (as sql `like`). See
+		Dataset.search().
+		"""
+		self.__unpackedtags([tag])
+		return Dataset.search(self, tag, data, order)
+	
+	
+	def records(self, where=None, order='recid', limit=None, after=None):
+		"""
+		Return a generator yielding a Record for each record in this 
+		dataset, with packed values included. See Dataset.records().
+		"""
+		packed = self.__unpackedtags(list(where or {}) + [order.lstrip('-')])
+		recs = Dataset.records(self, where, order, limit, after)
+		return self.__withpacked(recs, packed) if packed else recs
+	
+	
+	def column(self, tag):
+		"""
+		Generator; yields (recid, value) for each of this dataset's
+		values of `tag`, packed or not, in recid order.
+		"""
+		db = self.db
+		r = db.opq('tag-find', (tag,)).fetchone()
+		if not r:
+			return iter([])
+		args = (self.setid, r[0])
+		values = db.stream(db.sop['tval-column'], args)
+		if r[0] not in self.packed().values():
+			return values
+		return heapq.merge(self.__blocks(args), values)
+	
+	
+	def packed(self):
+		"""Return a dict of the packed tags of this dataset and their ids."""
+		return dict(self.db.opq('tblock-tags', (self.setid,)).fetchall())
+	
+	
+	# PACK
+	def pack(self, tags=None, block=DATASET_BLOCK):
+		"""
+		Move the unpacked values of each of `tags` (default: all of this
+		dataset's tags) into compressed blocks of up to `block` values;
+		Returns the number of values packed.
 		
+		A block holds the recids (as differences from the previous
+		recid) and values of consecutive records, pickled and compressed
+		with zlib. Numeric series pack far smaller than they're stored
+		in tval, and column() reads them quickly, but packed values can't
+		be searched or indexed by the database.
+		"""
+		db = self.db
+		if tags is None:
+			tags = [r[0] for r in db.opq('tval-tags', (self.setid,))]
+		n = 0
+		with self.lock:
+			try:
+				for tag in tags:
+					r = db.opq('tag-find', (tag,)).fetchone()
+					if r:
+						n += self.__pack(r[0], block)
+				db.commit()
+			except Exception:
+				db.rollback()
+				raise
+		return n
 	
-	def __dataAdd(self, data):
-		c = self.db.opq('data-find', (data,))
-		x = c.fetchone()
-		if x:
-			return x[0]
-		self.db.opq('data-add', (data,))
-		return self.__dataAdd(data)
+	
+	# UNPACK
+	def unpack(self, tags=None):
+		"""
+		Move the packed values of each of `tags` (default: all packed
+		tags) back into tval; Returns the number of values unpacked.
+		"""
+		db = self.db
+		packed = self.packed()
+		tagids = [packed[t] for t in (packed if tags is None else tags)
+			if t in packed
+		]
+		n = 0
+		with self.lock:
+			try:
+				for tagid in tagids:
+					blocks = self.__blocks((self.setid, tagid))
+					n += db.opmany('tval-add', (
+						(recid, tagid, v) for recid, v in blocks
+					))
+					db.opq('tblock-del', (self.setid, tagid))
+				db.commit()
+			except Exception:
+				db.rollback()
+				raise
+		return n
 	
 	
-	def __tagAdd(self, tag):
-		c = self.db.opq('tag-find', (tag,))
-		x = c.fetchone()
-		if x:
-			return x[0]
-		self.db.opq('tag-add', (tag,))
-		self.db.commit()
-		return self.__tagAdd(tag)
+	def _addbatch(self, dicts, pending):
+		# Add records for a list of dicts; the caller commits. Ids of 
+		# tags added are stored in `pending` until then.
+		values = []
+		for d in dicts:
+			recid = self._insert('rec-add', (self.setid, time.time()),
+				'rec-max', (self.setid,)
+			)
+			for tag in d:
+				values.append((recid, 
+					self._id(('tag', tag), tag, 'tag', pending), d[tag]
+				))
+		self.db.opmany('tval-add', values, len(values))
+	
+	
+	def __pack(self, tagid, block):
+		# Pack the tval values of tag `tagid`; the caller commits.
+		db = self.db
+		rows = db.stream(db.sop['tval-column'], (self.setid, tagid))
+		n = 0
+		while True:
+			rr = list(itertools.islice(rows, block))
+			if not rr:
+				return n
+			db.opq('tblock-add', (self.setid, tagid, rr[0][0], rr[-1][0],
+				len(rr), db.mod.Binary(packblock(rr))
+			))
+			db.opmany('tval-del', [(tagid, r[0]) for r in rr], len(rr))
+			n += len(rr)
+	
+	
+	def __blocks(self, args):
+		# Iterate (recid, value) for all blocks of (setid, tagid) `args`.
+		db = self.db
+		return itertools.chain.from_iterable(
+			db.stream(db.sop['tblock-list'], args, row=unblock)
+		)
+	
+	
+	def __unpackedtags(self, tags):
+		# Raise if any of `tags` is packed; Returns the packed dict.
+		packed = self.packed()
+		for tag in tags:
+			if tag in packed:
+				raise ValueError('dataset-tag-packed', xdata(tag=tag,
+					detail='unpack-required', setname=self.setname
+				))
+		return packed
+	
+	
+	def __withpacked(self, recs, packed):
+		# Generator; add the packed values of each record in `recs`. The
+		# block (or gap between blocks) holding the last recid read is
+		# kept for each tag, so sequential reads load each block once.
+		spans = {}
+		for rec in recs:
+			for tag in packed:
+				sp = spans.get(tag)
+				if not (sp and (sp[0] <= rec.recid <= sp[1])):
+					sp = spans[tag] = self.__span(packed[tag], rec.recid)
+				if rec.recid in sp[2]:
+					rec[tag] = sp[2][rec.recid]
+			yield rec
+	
+	
+	def __span(self, tagid, recid):
+		# Return (first, last, {recid:value}) for the block of `tagid`
+		# that holds `recid`, or for the gap between blocks that does.
+		db = self.db
+		args = (self.setid, tagid, recid)
+		r = db.opq('tblock-find', args).fetchone()
+		if r and (r[1] >= recid):
+			return (r[0], r[1], dict(unblock(r)))
+		nx = db.opq('tblock-next', args).fetchone()[0]
+		return (
+			r[1] + 1 if r else float('-inf'), 
+			nx - 1 if nx is not None else float('inf'), 
+			{}
+		)
+
+
+
+
+#
+# RECORD
+#
+class Record(dict):
+	"""
+	A dict of a record's fields (tag: data) as returned by the records()
+	method of Dataset. The record's id and timestamp are given by the
+	`recid` and `dt` attributes; `key` is the value to pass as the 
+	`after` argument of records() to get records that follow this one.
+	"""
+	def __init__(self, recid, dt, ok=None):
+		dict.__init__(self)
+		self.recid = recid
+		self.dt = dt
+		self.key = (ok, recid)
+
+
+
+
+
+#
+# ID CACHE
+#
+class IdCache(TypeCache):
+	"""
+	An LRU cache mapping tag and data values to their ids; keys are
+	('tag', tag) or ('data', type, value). A Datasets object shares one
+	with all its Dataset objects.
+	"""
+	def stats(self):
+		"""Return a dict with cache counters and `hitrate`."""
+		d = TypeCache.stats(self)
+		n = d['hits'] + d['misses']
+		d['hitrate'] = float(d['hits']) / n if n else None
+		return d
+
+
+
+
+
+#
+# UTILITY
+#
+def typedvalue(x):
+	"""
+	Return text `x` as an int or float if it's exactly the text the eav
+	engine stores for that number, else return `x` unchanged.
+	"""
+	if not isinstance(x, basestring) or not x or not (
+			x[0].isdigit() or x[0] in '-.'
+		):
+		return x
+	try:
+		i = int(x)
+		if str(i) == x:
+			return i
+	except ValueError:
+		pass
+	try:
+		f = float(x)
+		if (repr(f) == x) or ('%.15g' % f == x):
+			return f
+	except ValueError:
+		pass
+	return x
+
+
+def packblock(rows):
+	"""
+	Return a list of (recid, value) `rows`, in recid order, as a block:
+	the recid differences and values, pickled and zlib-compressed.
+	"""
+	ids = [r[0] for r in rows]
+	deltas = [b - a for a, b in zip(ids[:1] + ids[:-1], ids)]
+	return zlib.compress(pickle.dumps([deltas, [r[1] for r in rows]], 2))
+
+
+def unblock(row):
+	"""
+	Given a tblock row (recid0, recid1, data), return its list of 
+	(recid, value) pairs.
+	"""
+	deltas, values = pickle.loads(zlib.decompress(bytes(row[2])))
+	ids = []
+	recid = row[0]
+	for d in deltas:
+		recid += d
+		ids.append(recid)
+	return list(zip(ids, values))
 
 
 
@@ -334,7 +892,234 @@ DATASET_SQL = {
 					inner join data d on (f.dataid = d.dataid)
 					inner join tag t on (f.tagid = t.tagid)
 				where s.setid=? and t.tag=? and d.data like ?
-				order by ?
+			""",
+			
+			#
+			# TYPED ENGINE; see DATASET_TYPED_CREATE
+			#
+			"tval-add" : "insert into tval (recid, tagid, v) values (?,?,?)",
+			"tval-del" : "delete from tval where tagid=? and recid=?",
+			"tval-tags" : """
+				select distinct t.tag from tval v
+					inner join record r on (r.recid = v.recid)
+					inner join tag t on (t.tagid = v.tagid)
+				where r.setid=?
+			""",
+			"tval-column" : """
+				select v.recid, v.v from tval v
+					inner join record r on (r.recid = v.recid)
+				where r.setid=? and v.tagid=?
+				order by v.recid
+			""",
+			"tval-search" : """
+				select r.dt, s.setname, s.setid, r.recid, 
+					t.tag, v.tagid, v.v as data
+				from record r
+					inner join dataset s on (s.setid = r.setid)
+					inner join tval v on (v.recid = r.recid)
+					inner join tag t on (v.tagid = t.tagid)
+				where s.setid=? and t.tag=? and v.v like ?
+			""",
+			
+			"tblock-add" : """
+				insert into tblock (setid, tagid, recid0, recid1, n, data)
+					values (?,?,?,?,?,?)
+			""",
+			"tblock-del" : "delete from tblock where setid=? and tagid=?",
+			"tblock-tags" : """
+				select t.tag, b.tagid from tblock b
+					inner join tag t on (t.tagid = b.tagid)
+				where b.setid=?
+				group by b.tagid
+			""",
+			"tblock-list" : """
+				select recid0, recid1, data from tblock
+				where setid=? and tagid=?
+				order by recid0
+			""",
+			"tblock-find" : """
+				select recid0, recid1, data from tblock
+				where setid=? and tagid=? and recid0<=?
+				order by recid0 desc limit 1
+			""",
+			"tblock-next" : """
+				select min(recid0) from tblock
+				where setid=? and tagid=? and recid0>?
 			"""
 		}
 	}
+
+
+
+# sortable columns of the "search-data" op; see Dataset.search()
+DATASET_SEARCH_COLS = {
+	'dt':'r.dt', 'setname':'s.setname', 'setid':'s.setid', 
+	'recid':'r.recid', 'tag':'t.tag', 'tagid':'f.tagid', 'data':'d.data',
+	'dataid':'d.dataid'
+}
+
+
+#
+# DATASET_RECORDS_SQL
+#  - Query template for Dataset.records(). The inner query selects the
+#    page of record ids (with the order key, `ok`); the outer query 
+#    joins their fields.
+#
+DATASET_RECORDS_SQL = """
+	select k.recid, k.dt, k.ok, t.tag, d.data
+	from (
+		select * from (
+			select r.recid, r.dt, %(okey)s as ok 
+			from record r
+			where %(conds)s
+		)
+		where %(keyset)s
+		order by ok %(dir)s, recid %(dir)s
+		%(limit)s
+	) k
+		left join field f on (f.recid = k.recid)
+		left join tag t on (t.tagid = f.tagid)
+		left join data d on (d.dataid = f.dataid)
+	order by k.ok %(dir)s, k.recid %(dir)s
+"""
+
+# order key for a tag's data; records without the tag sort first
+DATASET_RECORDS_TAGKEY = """
+	ifnull((
+		select min(xd.data) from field xf
+			inner join data xd on (xd.dataid = xf.dataid)
+		where xf.recid = r.recid 
+			and xf.tagid = (select tagid from tag where tag=?)
+	), '')
+"""
+
+# condition: record has a field with tag (first arg) equal to data
+DATASET_RECORDS_WHERE = """
+	r.recid in (
+		select wf.recid from field wf
+			inner join tag wt on (wt.tagid = wf.tagid)
+			inner join data wd on (wd.dataid = wf.dataid)
+		where wt.tag=? and wd.data=?
+	)
+"""
+
+# rows fetched at a time by Dataset.records()
+DATASET_FETCH = 1000
+
+
+
+
+#
+# DATASET_TYPED_CREATE
+#  - Tables of the 'typed' engine, created by Datasets as needed. The
+#    record, tag, and dataset tables are those of DATASET_SQL. Column
+#    `v` has no type affinity, so values are stored as given.
+#
+DATASET_TYPED_CREATE = [
+	"""
+	create table if not exists tval (
+		recid INTEGER,
+		tagid INTEGER,
+		v,
+		PRIMARY KEY (recid, tagid)
+	) without rowid
+	""",
+	"""
+	create index if not exists ix_tval_tag 
+		on tval (tagid, v)
+	""",
+	"""
+	create table if not exists tblock (
+		setid INTEGER,
+		tagid INTEGER,
+		recid0 INTEGER,
+		recid1 INTEGER,
+		n INTEGER,
+		data BLOB,
+		PRIMARY KEY (setid, tagid, recid0)
+	)
+	"""
+]
+
+# sortable columns of the "tval-search" op
+DATASET_TYPED_SEARCH_COLS = {
+	'dt':'r.dt', 'setname':'s.setname', 'setid':'s.setid', 
+	'recid':'r.recid', 'tag':'t.tag', 'tagid':'v.tagid', 'data':'v.v'
+}
+
+# Dataset.records() query for the typed engine; see DATASET_RECORDS_SQL
+DATASET_TYPED_RECORDS_SQL = """
+	select k.recid, k.dt, k.ok, t.tag, v.v
+	from (
+		select * from (
+			select r.recid, r.dt, %(okey)s as ok 
+			from record r
+			where %(conds)s
+		)
+		where %(keyset)s
+		order by ok %(dir)s, recid %(dir)s
+		%(limit)s
+	) k
+		left join tval v on (v.recid = k.recid)
+		left join tag t on (t.tagid = v.tagid)
+	order by k.ok %(dir)s, k.recid %(dir)s
+"""
+
+# order key for a tag's value; records without the tag sort first (as
+# -infinity, since typed values may be numbers)
+DATASET_TYPED_RECORDS_TAGKEY = """
+	ifnull((
+		select xv.v from tval xv
+		where xv.recid = r.recid 
+			and xv.tagid = (select tagid from tag where tag=?)
+	), -9e999)
+"""
+
+# condition: record has a field with tag (first arg) equal to value
+DATASET_TYPED_RECORDS_WHERE = """
+	r.recid in (
+		select wv.recid from tval wv
+			inner join tag wt on (wt.tagid = wv.tagid)
+		where wt.tag=? and wv.v=?
+	)
+"""
+
+# eav fields to migrate; see Datasets.migrate()
+DATASET_MIGRATE_SQL = """
+	select f.recid, f.tagid, d.data from field f
+		inner join data d on (d.dataid = f.dataid)
+"""
+
+
+
+#
+# DATASET_ENGINES
+#  - Storage engines: the Dataset type, tables to create, ops required
+#    in the database's sql config, and search and records() sql.
+#
+DATASET_ENGINES = {
+	'eav' : {
+		'type'           : Dataset,
+		'create'         : None,
+		'ops'            : [],
+		'search'         : 'search-data',
+		'search-cols'    : DATASET_SEARCH_COLS,
+		'records'        : DATASET_RECORDS_SQL,
+		'records-tagkey' : DATASET_RECORDS_TAGKEY,
+		'records-where'  : DATASET_RECORDS_WHERE
+	},
+	'typed' : {
+		'type'           : TypedDataset,
+		'create'         : DATASET_TYPED_CREATE,
+		'ops'            : [
+			'tval-add', 'tval-del', 'tval-tags', 'tval-column', 'tval-search',
+			'tblock-add', 'tblock-del', 'tblock-tags', 'tblock-list', 
+			'tblock-find', 'tblock-next'
+		],
+		'search'         : 'tval-search',
+		'search-cols'    : DATASET_TYPED_SEARCH_COLS,
+		'records'        : DATASET_TYPED_RECORDS_SQL,
+		'records-tagkey' : DATASET_TYPED_RECORDS_TAGKEY,
+		'records-where'  : DATASET_TYPED_RECORDS_WHERE
+	}
+}
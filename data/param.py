@@ -53,7 +53,14 @@ class Chain(object):
 	The only exception to the 'returns self' rule is the __call__()
 	method, which returns a new object of type(self), passing any given
 	arguments along to the constructor.
+	
+	Chain and Param define __slots__, so their `v` and `i` attributes
+	are quick to read and set. Param also keeps a `__dict__` slot, so
+	callbacks may still set other attributes on a param (the dict is
+	created only when they do).
 	"""
+	__slots__ = ['v']
+	
 	def __init__(self, v=None):
 		self.v = v
 	
@@ -118,6 +125,8 @@ class Param(Chain):
 	a while to what you're getting back as you chain calls together, 
 	but once you get it, it's a powerful tool for use in lambdas.
 	"""
+	__slots__ = ['i', '__re', '__dict__']
+	
 	def __init__(self, v=None, i=None):
 		self.v = v
 		self.i = i
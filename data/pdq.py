@@ -9,15 +9,18 @@ PDQ is a tool for quick exploration and manipulation of python lists.
 Create a Query object passing a list or text to the constructor. Use 
 Query methods to massage the data until it's just what you need. The 
 rows, select, update, delete and each methods accept keyword `where` 
-- a callable that returns True for matching records.
+- a callable that returns True for matching records, or a compiled 
+data.pred.Pred predicate.
 
 The head(), peek(), and grid() methods display small sections of 
 current data in various formats, and fmt() is available to help you
 format (or output) the data in various other ways. The data property
 returns the data itself, or lets you completely reset the data. There
-is even a one-time undo() method in case you get unexpected results.
-Calling undo() repeatedly toggles self.data between the previous and
-current values.
+is even an undo() method in case you get unexpected results. By 
+default, one step is kept and calling undo() repeatedly toggles 
+self.data between the previous and current values; pass `undo` and
+`undomem` kwargs to keep a longer (or memory-bounded) history, and 
+use redo() to step forward again.
 
 Use keyword arg `file` to specify a text file to import as string 
 data.
@@ -41,9 +44,50 @@ string values.
 import pdq
 q = pdq.Query(file="myarchive.zip", member="some.csv")
 q.peek()
+
+LAZY QUERIES:
+Pass lazy=True to compose select, update, delete, each, splitlines,
+and sort into a generator pipeline that runs only when rows are read.
+Files and streams are read line by line, so head() and peek() work 
+on very large files using little memory. See Query.lazy.
+
+# EXAMPLE:
+q = pdq.Query(file="huge.log.gz", encoding="utf8", lazy=True)
+q.splitlines().delete(where=lambda r: 'DEBUG' in r.v).peek()
+
+INDEXES:
+Repeated lookups on list data can use secondary indexes. Once created,
+an index is used whenever a data.pred `where` tests its key.
+
+# EXAMPLE:
+from pyrox.data.pred import at
+q.index('host', 0).index('time', 3, sorted=True)
+q.select(where=at(0).eq('example.com') & at(3).lt(1500000000))
 """
 
+import bisect, heapq, itertools, multiprocessing, operator, tempfile
+import threading
+
+from multiprocessing.pool import ThreadPool
+
+try:
+	import cPickle as pickle
+except:
+	import pickle
+
 from .param import *
+from .pred import Pred
+
+
+# default undo history limits; see Query constructor
+QUERY_UNDO_DEPTH = 1
+QUERY_UNDO_MEM = None
+
+# rows sorted in memory by lazy queries; None for no limit. See sort()
+QUERY_SORT_SPILL = None
+
+# rows per chunk sent to pmap/pselect workers
+QUERY_CHUNK = 1024
 
 
 class Query(Base):
@@ -57,6 +101,18 @@ class Query(Base):
 		
 		Additional kwargs:
 		 - row    : a custom row type may be specified to replace QRow
+		 - reuse  : if True, one row object is rebound to each value in
+		            turn rather than creating a row for each value; see
+		            QRow
+		 - lazy   : if True, create a lazy query; see Query.lazy. Lazy
+		            queries also accept, as data, a callable returning an
+		            iterable; it's called each time the source is read
+		 - undo   : number of undo steps to keep (default: 1)
+		 - undomem: approximate limit, in bytes, of memory held by undo
+		            history; older steps are dropped to stay within it
+		 - chunk  : size of the blocks in which lazy queries read text
+		            from a file or stream (default: fs.FS_CHUNK); eager
+		            queries read the whole source at once
 		 
 		Additional kwarg sets:
 		 * stream
@@ -71,11 +127,34 @@ class Query(Base):
 		self.__encoding = k.get('encoding', None)
 		
 		# type specification for row object
-		self.__TRow = k.get('row', QRow)
+		self.__TRow = k.pop('row', QRow)
+		self.__reuse = k.pop('reuse', False)
+		
+		# undo history
+		self.__journal = Journal(
+			k.pop('undo', QUERY_UNDO_DEPTH), k.pop('undomem', QUERY_UNDO_MEM)
+		)
+		
+		# secondary indexes; see Query.index
+		self.__indexes = {}
+		self.__version = 0
+		
+		# lazy mode; see Query.lazy
+		self.__lazy = k.pop('lazy', False)
+		self.__steps = []
+		self.__redo = None
+		self.__chunk = k.pop('chunk', None)
 		
 		# make sure there's something for data
 		self.__data = data = data if data else ''
 		
+		# lazy queries keep a source (a function that returns an iterator)
+		# rather than data
+		if self.__lazy:
+			self.__source = self.__lazysource(data, k)
+			self.__data = None
+			return
+		
 		# allow reading of text or gzip files
 		if 'file' in k:
 			reader = Base.path(k.pop('file')).reader(**k)
@@ -88,9 +167,32 @@ class Query(Base):
 		# if 'encoding' is specified, decode bytes only
 		if self.__encoding and isinstance(self.__data, pxbytes):
 			self.__data = self.__data.decode(self.__encoding)
-		
-		# prep undo
-		self.__undo = self.__data
+	
+	
+	def __lazysource(self, data, k):
+		# Return a function that returns a new iterator over the source
+		# data. Text sources yield pieces of text (eg, blocks read from a
+		# file) to be split by splitlines(); other data (eg, csv rows)
+		# yields its items.
+		enc = self.__encoding
+		size = self.__chunk
+		if 'file' in k:
+			path = k.pop('file')
+			return lambda: genread(Base.path(path).reader(**k), size)
+		elif 'stream' in k:
+			stream = k['stream']
+			ek = dict(encoding=enc) if enc else {}
+			return lambda: genread(
+				Base.ncreate('fs.Reader', stream, **ek), size, close=False
+			)
+		elif isinstance(data, pxbytes) and enc:
+			data = data.decode(enc)
+		if isinstance(data, (basestring, pxbytes)):
+			return lambda: iter([data])
+		if callable(data):
+			return lambda: iter(data())
+		return lambda: iter(data)
+	
 	
 	def __getitem__(self, key):
 		return self.data[key]
@@ -103,17 +205,76 @@ class Query(Base):
 	
 	@property
 	def type(self):
-		return type(self.__data)
+		return type(self.data)
+	
+	@property
+	def lazy(self):
+		"""
+		True if this query is lazy. The select, update, delete, each,
+		splitlines, and sort methods of a lazy query add steps to a 
+		generator pipeline instead of processing data. Steps run only
+		when rows are read - through the data property, head(), peek(),
+		rows(), etc... - and head() and peek() read only the rows they
+		display, so memory use doesn't depend on the size of the source.
+		
+		Reading `data` stores the result as the query's new source and
+		clears the pipeline.
+		"""
+		return self.__lazy
 	
 	@property
 	def data(self):
+		if self.__lazy and (self.__steps or self.__data is None):
+			self.data = list(self.__pipe())
 		return self.__data
 	
 	@data.setter
 	def data(self, d):
 		if d == self: raise ValueError('pdq-data-invalid')
-		self.__undo = self.__data
+		if self.__lazy:
+			self.__source = lambda: iter(d)
+			self.__steps = []
+			self.__redo = None
+		else:
+			self.__journal.push(('ref', self.__data), d)
+		old = self.__data
 		self.__data = d
+		self.__changed('ref', old)
+	
+	@property
+	def history(self):
+		"""
+		Return a dict describing undo history: the number of `undo` and
+		`redo` steps available, configured `depth` and `mem` limits, and
+		the approximate `size` in bytes of memory held by the history.
+		"""
+		return self.__journal.stats()
+	
+	
+	# LAZY PIPELINE
+	
+	def __pipe(self):
+		# Return an iterator over source data with all steps applied.
+		it = self.__source()
+		for step in self.__steps:
+			it = step(it)
+		return it
+	
+	def __step(self, step):
+		# Add a step (a function that takes and returns an iterator).
+		self.__steps.append(step)
+		self.__redo = None
+		return self
+	
+	def __fork(self, step):
+		# Return a new lazy query sharing this query's source and steps,
+		# plus `step`.
+		q = Query(lazy=True, row=self.__TRow, encoding=self.__encoding,
+			reuse=self.__reuse
+		)
+		q.__source = self.__source
+		q.__steps = self.__steps + [step]
+		return q
 	
 	
 	# UTILITY METHODS
@@ -122,6 +283,9 @@ class Query(Base):
 	def head(self, *a):
 		"""Return, from the given offset, the given number of lines."""
 		x,y = (a[0],sum(a[0:2])) if len(a)>1 else (0, a[0] if a else 9)
+		if self.__lazy and (self.__steps or self.__data is None):
+			self.lasthead = 'lazy'
+			return list(itertools.islice(self.__pipe(), x, y))
 		try:
 			lines = self.data.splitlines()
 			try:
@@ -164,7 +328,22 @@ class Query(Base):
 		"""
 		Returns a generator of type QRow for matching rows.
 		"""
-		return self.__TRow.paramgen(self.data, self, *a, **k)
+		if self.__lazy and (self.__steps or self.__data is None):
+			return self.__rowgen(self.__pipe(), *a, **k)
+		return self.__rowgen(self.data, *a, **k)
+	
+	def __rowgen(self, it, *a, **k):
+		# Return a QRow generator for iterator `it`. If `it` is this
+		# query's data and an index can answer a Pred `where`, only the
+		# candidate rows the index selects are tested.
+		if self.__indexes and (it is self.__data) and (
+				isinstance(k.get('where'), Pred)) and ('offsets' not in k):
+			offsets = self.__plan(k['where'].fold())
+			if offsets is not None:
+				k['offsets'] = offsets
+		if self.__reuse:
+			k.setdefault('reuse', True)
+		return self.__TRow.paramgen(it, self, *a, **k)
 	
 	
 	#
@@ -173,51 +352,156 @@ class Query(Base):
 	
 	def undo(self):
 		"""
-		Limited undo; works like the old-fashioned undo - undo twice to
-		redo.
+		Undo the last change to data. If there's nothing left to undo,
+		the last undone change is redone, so with the default history
+		depth of 1 this works like the old-fashioned undo - undo twice
+		to redo. For lazy queries, undo removes the last pipeline step
+		(and undo again restores it).
 		"""
-		u = self.__data
-		self.__data = self.__undo
-		self.__undo = u
+		if self.__lazy:
+			if self.__redo:
+				self.__steps.append(self.__redo)
+				self.__redo = None
+			elif self.__steps:
+				self.__redo = self.__steps.pop()
+			return self
+		if self.__journal.undos:
+			self.__replay(False)
+		elif self.__journal.redos:
+			self.__replay(True)
 		return self
 	
+	def redo(self):
+		"""Redo the last undone change to data."""
+		if self.__lazy:
+			if self.__redo:
+				self.__steps.append(self.__redo)
+				self.__redo = None
+		elif self.__journal.redos:
+			self.__replay(True)
+		return self
+	
+	def __replay(self, redo):
+		# Apply the next undo (or redo) journal entry to data, updating
+		# indexes to match. A 'del' entry reinserts rows, an 'ins' entry
+		# removes them, and a 'ref' entry restores a previous data object.
+		kind, x = self.__journal.peek(redo)
+		old = self.__data
+		if redo:
+			self.__data = self.__journal.redo(old)
+		else:
+			self.__data = self.__journal.undo(old)
+		if kind == 'del':
+			self.__changed('ins', x)
+		elif kind == 'ins':
+			self.__changed('del', x)
+		else:
+			self.__changed('ref', old)
+	
 	def splitlines(self, *a, **k):
+		if self.__lazy:
+			keep = a[0] if a else k.get('keepends', False)
+			return self.__step(lambda it: genlines(it, keep))
 		self.data = self.data.splitlines(*a, **k)
 		return self
 	
 	def select(self, fn=None, *a, **k):
 		"""Returns a new Query with a copy of matching records."""
-		result = []
-		for row in self.rows(*a, **k):
+		if self.__lazy:
+			return self.__fork(lambda it: self.__select(it, fn, *a, **k))
+		return Query(list(self.__select(self.data, fn, *a, **k)))
+	
+	def __select(self, data, fn, *a, **k):
+		for row in self.__rowgen(data, *a, **k):
 			try:
-				result.append(fn(row) if fn else row.v[:])
+				yield fn(row) if fn else row.v[:]
 			except Exception as ex:
 				raise type(ex)('callback-fail', xdata(i=row.i, v=row.v,
 					python=str(ex))
-				)	
-		return Query(result)
+				)
 	
 	def sort(self, fn=None, **k):
-		"""Sort self.data, by the results of fn if given."""
-		fn = k.get('desc', k.get('asc', fn))
-		if fn:
-			order = []
-			for row in self.rows():
-				order.append([fn(row), row.v])
-			reversed(order).sort() if k.get('desc') else order.sort()
-			self.data = map(lambda o: o[1], order)
-		else:
-			if k.get('desc'):
-				self.data = reverse(d)
-			else:
-				sdata = self.data[:]
-				sdata.sort()
-				self.data = sdata
+		"""
+		Sort self.data, by the results of fn if given. Sorts are stable;
+		each row's key is computed once, and rows with equal keys keep
+		their order (row values are never compared to break ties).
+		
+		Kwargs:
+		 - asc   : callable; same as fn
+		 - desc  : callable, to sort by its results in descending order,
+		           or True to sort values in descending order
+		 - by    : a list of key specifications; rows are sorted by the
+		           first, then the second, etc. Each may be an item key
+		           (eg, a list offset or dict key), a callable that's
+		           given each row's value, or a tuple - (spec, 'desc') -
+		           for descending order
+		 - spill : lazy queries only; the number of rows to sort in
+		           memory. Larger sources are sorted in runs of `spill`
+		           rows, written to temporary files, and merged as rows
+		           are read (default: QUERY_SORT_SPILL)
+		
+		# EXAMPLE
+		q.sort(by=[2, (0, 'desc')])
+		"""
+		specs = self.__sortspecs(fn, k)
+		if self.__lazy:
+			spill = k.get('spill', QUERY_SORT_SPILL)
+			return self.__step(lambda it: sortgen(enumerate(it), specs, spill))
+		self.data = sortpairs(list(enumerate(self.data)), specs)
+		return self
+	
+	def top(self, n, fn=None, **k):
+		"""
+		Keep the `n` rows that would be last if sorted with the same 
+		arguments (except spill), largest first. Only `n` rows are held
+		in memory, so this is much faster than a full sort when n is 
+		small, and lazy queries may take top rows of any size source.
+		"""
+		return self.__topn(n, fn, k, heapq.nlargest)
+	
+	def bottom(self, n, fn=None, **k):
+		"""
+		Keep the `n` rows that would be first if sorted with the same 
+		arguments (except spill), smallest first. See top().
+		"""
+		return self.__topn(n, fn, k, heapq.nsmallest)
+	
+	def __topn(self, n, fn, k, select):
+		key = sortkey(self.__sortspecs(fn, k))
+		step = lambda it: (p[1] for p in select(n, enumerate(it), key=key))
+		if self.__lazy:
+			return self.__step(step)
+		self.data = list(step(self.data))
 		return self
 	
+	def __sortspecs(self, fn, k):
+		# Return a list of (keyfn, descending) sort specifications, where
+		# each keyfn takes an (offset, value) pair.
+		desc = k.get('desc')
+		fn = desc if callable(desc) else k.get('asc', fn)
+		if fn:
+			TRow = self.__TRow
+			return [(lambda p: fn(TRow(self, p[1], p[0])), bool(desc))]
+		elif k.get('by') is not None:
+			by = k['by'] if isinstance(k['by'], list) else [k['by']]
+			specs = []
+			for spec in by:
+				spec, order = spec if isinstance(spec, tuple) else (spec, 'asc')
+				if order not in ('asc', 'desc'):
+					raise ValueError('pdq-sort-invalid', xdata(order=order,
+						valid=['asc', 'desc']
+					))
+				f = keyfn(spec)
+				specs.append((lambda p, f=f: f(p[1]), order == 'desc'))
+			return specs
+		return [(lambda p: p[1], bool(desc))]
+	
 	def update(self, fn, *a, **k):
 		"""Update matching self.data rows to fn result; Return self."""
-		self.__undo = self.select().data
+		if self.__lazy:
+			return self.__step(
+				lambda it: (fn(row) for row in self.__rowgen(it, *a, **k))
+			)
 		result = []
 		for row in self.rows(*a, **k):
 			result.append(fn(row))
@@ -230,39 +514,1033 @@ class Query(Base):
 		Return self.
 		"""
 		fn = k.get('where', lambda *a,**k: False)
-		k['where'] = lambda *a, **k: not fn(*a, **k) # reverse where...
+		
+		# For lists, only the deleted rows are kept for undo.
+		if isinstance(self.__data, list) and not self.__lazy:
+			drop = set([row.i for row in self.rows(*a, **dict(k, where=fn))])
+			result = []
+			deleted = []
+			for i,v in enumerate(self.__data):
+				if i in drop:
+					deleted.append((i, v))
+				else:
+					result.append(v)
+			self.__journal.push(('del', deleted))
+			self.__data = result
+			self.__changed('del', [i for i,v in deleted])
+			return self
+		
+		if isinstance(fn, Pred):
+			k['where'] = ~fn
+		else:
+			k['where'] = lambda *a, **k: not fn(*a, **k) # reverse where...
 		
 		# ...deletes by selecting and keeping what should NOT be deleted.
+		if self.__lazy:
+			return self.__step(
+				lambda it: (row.v for row in self.__rowgen(it, *a, **k))
+			)
+		
 		newq = self.select(*a, **k)
 		self.data = newq.data
 		return self
 	
+	def pmap(self, fn, **k):
+		"""
+		Like update(), but `fn` is called in a pool of worker processes
+		(or threads); Returns self. Rows are sent to workers in chunks
+		and results are kept in their original order.
+		
+		Kwargs:
+		 - where  : as for update(); tested in the workers
+		 - workers: number of workers (default: one for each cpu)
+		 - chunk  : rows per chunk (default: QUERY_CHUNK)
+		 - threads: if True, use a thread pool; that's best for I/O-bound
+		            callbacks, and callbacks need not be picklable
+		
+		A callback failure raises 'callback-fail', with the row's i and
+		v, just as select() does. After the data is processed, attribute
+		`lastchunks` holds a dict for each chunk giving its number, the
+		rows sent and returned, seconds taken, and worker.
+		
+		NOTE: Worker processes get rows whose `q` is None. Where worker
+		      processes are spawned rather than forked (eg, Windows),
+		      `fn` and `where` must be picklable.
+		"""
+		if self.__lazy:
+			return self.__step(lambda it: self.__pgen(it, fn, k))
+		self.data = list(self.__pgen(self.data, fn, k))
+		return self
+	
+	def pselect(self, fn=None, **k):
+		"""
+		Like select(), but `fn` is called in a pool of worker processes
+		(or threads); Returns a new Query. See pmap() for kwargs.
+		"""
+		if self.__lazy:
+			return self.__fork(lambda it: self.__pgen(it, fn, k))
+		return Query(list(self.__pgen(self.data, fn, k)))
+	
+	def __pgen(self, data, fn, k):
+		# Yield the results of fn for matching rows, run in a pool.
+		workers = k.get('workers')
+		where = k.get('where')
+		chunk = k.get('chunk', QUERY_CHUNK)
+		pairs = iter(data.items()) if isinstance(data, dict) else enumerate(data)
+		chunks = enumerate(iter(lambda: list(itertools.islice(pairs, chunk)), []))
+		
+		if k.get('threads'):
+			pool = ThreadPool(workers)
+			job = lambda c: pqchunk(c, fn, where, self.__TRow, self)
+		else:
+			pool = multiprocessing.Pool(workers, pqinit, (fn, where, self.__TRow))
+			job = pqrun
+		
+		self.lastchunks = times = []
+		try:
+			for n, result, size, t, worker in pool.imap(job, chunks):
+				times.append(dict(chunk=n, rows=size, results=len(result), 
+					seconds=t, worker=worker
+				))
+				for v in result:
+					yield v
+			pool.close()
+			pool.join()
+		finally:
+			pool.terminate()
+	
 	def each(self, fn, *a, **k):
 		"""Execute fn for matching rows."""
+		if self.__lazy:
+			return self.__step(lambda it: self.__each(it, fn, *a, **k))
 		for row in self.rows(*a, **k):
 			fn(row)
 		return self
+	
+	def __each(self, it, fn, *a, **k):
+		# Pass each item through, calling fn for matching rows.
+		where = k.pop('where', None)
+		for row in self.__rowgen(it, *a, **k):
+			if (not where) or where(row):
+				fn(row)
+			yield row.v
+	
+	def join(self, other, on=None, how='inner', **k):
+		"""
+		Returns a new Query joining this query's rows (the left side) to
+		rows of `other` - a Query or list. Argument `on` specifies the key
+		that must be equal for rows to be joined. It may be an item key
+		(eg, a list offset or dict key), a list of item keys (for a 
+		compound key), or a callable that's given each row's value and
+		returns its key. If `how` is 'left', left rows with no match in
+		`other` are kept too.
+		
+		Kwargs:
+		 - rkey  : key specification for `other`'s rows, if it differs 
+		           from `on`
+		 - merge : callable given the left and right values of matching
+		           rows that returns the joined row; the default joins 
+		           lists into one list and dicts into one dict
+		 - fill  : right value passed to merge for unmatched left rows
+		           (default: None)
+		 - sorted: if True, both sides must already be sorted by key; 
+		           they're joined by merging, a row at a time, rather
+		           than by loading `other` into a hash table
+		
+		For lazy queries, the join is a pipeline step; other's rows are
+		read only when this query's rows are read.
+		"""
+		if how not in ('inner', 'left'):
+			raise ValueError('pdq-join-invalid', xdata(how=how,
+				valid=['inner', 'left']
+			))
+		lkey = keyfn(on)
+		rkey = keyfn(k.get('rkey', on))
+		merge = k.get('merge', jmerge)
+		fill = k.get('fill')
+		join = mergejoin if k.get('sorted') else hashjoin
+		right = other.__iter if isinstance(other, Query) else lambda: other
+		return self.__derive(
+			lambda it: join(it, right(), lkey, rkey, how, merge, fill)
+		)
+	
+	def groupby(self, key=None, **k):
+		"""
+		Returns a Grouping of rows by `key` (specified as for join's `on`
+		argument). Call the grouping's agg() method to get a new Query
+		with one row of aggregate values per group.
+		
+		Rows are aggregated as they're read, so only one accumulator per
+		group is held in memory. If kwarg `sorted` is True, rows must
+		already be sorted by key; each group's row is produced as soon as
+		the group ends, so lazy queries can aggregate sources of any size.
+		"""
+		return Grouping(self.__derive, key, k.get('sorted', False))
+	
+	def __iter(self):
+		# Return an iterator over values (for dicts, dict values).
+		if self.__lazy and (self.__steps or self.__data is None):
+			return self.__pipe()
+		d = self.data
+		return iter(d.values() if isinstance(d, dict) else d)
+	
+	def __derive(self, step):
+		# Return a new query containing the result of iterator function
+		# `step` - lazy if this query is lazy.
+		if self.__lazy:
+			return self.__fork(step)
+		return Query(list(step(self.__iter())))
+	
+	
+	# INDEXES
+	
+	def index(self, name, key=None, **k):
+		"""
+		Create (or replace) an index, `name`, of this query's list data.
+		Argument `key` is the item key (eg, a list offset or dict key) 
+		whose values are indexed, None to index whole row values, or a
+		callable that's given each row's value and returns its key. 
+		
+		By default, a hash index is created; it answers equality and 
+		`isin` tests. Pass sorted=True for a sorted index, which answers
+		range tests (gt, ge, lt, le) as well.
+		
+		When a Pred `where` is given to rows, select, update, delete, or
+		each, indexes whose key matches a Pred key (eg, the `at(2)` in
+		at(2).eq('x')) are used to find candidate rows, so only those 
+		rows are tested. Indexes are kept up to date as delete() removes
+		rows and as deletes are undone or redone; undoing or redoing any
+		other change restores the index as it was for that data. After 
+		other changes through query methods, indexes are rebuilt when 
+		next used. After changing data in place (eg, q.data.append(x)),
+		call reindex(). If an index can't be built (eg, a sorted index 
+		of values that can't be compared), matching rows are found by 
+		testing every row.
+		
+		Returns self.
+		"""
+		if self.__lazy or not isinstance(self.data, (list, tuple)):
+			raise TypeError('pdq-index-invalid', xdata(
+				reason='list-data-required', lazy=self.__lazy, 
+				type=str(type(self.__data))
+			))
+		self.__indexes[name] = QIndex(key, k.get('sorted', False))
+		return self
+	
+	def unindex(self, name=None):
+		"""Remove index `name` (or, if name is None, all indexes)."""
+		if name is None:
+			self.__indexes = {}
+		else:
+			self.__indexes.pop(name, None)
+		return self
+	
+	def reindex(self):
+		"""Rebuild indexes on next use; Returns self."""
+		self.__version += 1
+		for ix in self.__indexes.values():
+			ix.prior = None
+		return self
+	
+	@property
+	def indexes(self):
+		"""Return a dict describing each index, by name."""
+		return dict([[n, x.stats()] for n, x in self.__indexes.items()])
+	
+	def __plan(self, p):
+		# Return sorted offsets of candidate rows for folded Pred `p`, or
+		# None if indexes can't narrow the search.
+		t = p.node[0]
+		if t == 'and':
+			best = None
+			for x in p.node[1]:
+				c = self.__plan(x)
+				if (c is not None) and ((best is None) or (len(c) < len(best))):
+					best = c
+			return best
+		elif t == 'or':
+			cc = set()
+			for x in p.node[1]:
+				c = self.__plan(x)
+				if c is None:
+					return None
+				cc.update(c)
+			return sorted(cc)
+		elif t in ('cmp', 'in'):
+			key = p.node[2] if t == 'cmp' else p.node[1]
+			ranged = (t == 'cmp') and (p.node[1] not in ('eq', 'ne'))
+			for ix in self.__indexes.values():
+				if ix.callable or (ix.key != key) or (ranged and not ix.sorted):
+					continue
+				try:
+					ix.build(self.__data, self.__version)
+				except Exception:
+					continue # can't be built; try another index, or scan
+				return ix.plan(p.node)
+		return None
+	
+	def __changed(self, kind, x):
+		# Note a change to data: rows were removed from offsets `x` 
+		# ('del'), (offset, value) pairs `x` were inserted ('ins'), or
+		# data replaced previous data object `x` ('ref'). Indexes that
+		# were current are updated to match; see QIndex.change().
+		current = self.__version
+		self.__version += 1
+		keep = bool(self.__journal.depth)
+		for ix in self.__indexes.values():
+			ix.change(kind, x, self.__data, self.__version, 
+				ix.version == current, keep
+			)
 
 			
 
 
 
+class Journal(object):
+	"""
+	Undo/redo history for a Query's data. Each entry records only what
+	is needed to reverse a change:
+	 - ('ref', data) : the previous data object; rows it shares with the
+	                   current data are not copied
+	 - ('del', pairs): (offset, value) for each row a delete removed
+	 - ('ins', list) : offsets of rows to remove (the redo of a 'del')
+	
+	At most `depth` steps are kept. If `mem` is given, the oldest steps
+	are also dropped while the estimated memory held by the history 
+	(the containers plus any rows no longer in current data) exceeds 
+	`mem` bytes.
+	"""
+	def __init__(self, depth=QUERY_UNDO_DEPTH, mem=QUERY_UNDO_MEM):
+		self.depth = depth
+		self.mem = mem
+		self.__undo = []
+		self.__redo = []
+	
+	@property
+	def undos(self):
+		"""Number of undo steps available."""
+		return len(self.__undo)
+	
+	@property
+	def redos(self):
+		"""Number of redo steps available."""
+		return len(self.__redo)
+	
+	@property
+	def size(self):
+		"""Estimated bytes held by undo and redo steps."""
+		return sum([e[2] for e in self.__undo + self.__redo])
+	
+	def stats(self):
+		return dict(undo=self.undos, redo=self.redos, depth=self.depth, 
+			mem=self.mem, size=self.size
+		)
+	
+	def push(self, entry, current=None):
+		"""
+		Record `entry` for a change that resulted in data `current`;
+		clears any redo steps.
+		"""
+		self.__redo = []
+		if self.depth:
+			self.__undo.append(entry + (self.esize(entry, current),))
+			self.trim()
+	
+	def peek(self, redo=False):
+		"""Return the (kind, x) of the entry undo() (or redo()) applies."""
+		return (self.__redo if redo else self.__undo)[-1][:2]
+	
+	def undo(self, data):
+		"""Reverse the last change to `data`; Returns the result."""
+		e = self.__undo.pop()
+		data, inverse = self.apply(e, data)
+		self.__redo.append(inverse + (self.esize(inverse, data),))
+		return data
+	
+	def redo(self, data):
+		"""Reapply the last undone change to `data`; Returns the result."""
+		e = self.__redo.pop()
+		data, inverse = self.apply(e, data)
+		self.__undo.append(inverse + (self.esize(inverse, data),))
+		self.trim()
+		return data
+	
+	def trim(self):
+		"""Drop the oldest undo steps that exceed depth or mem limits."""
+		while len(self.__undo) > max(self.depth or 0, 0):
+			self.__undo.pop(0)
+		if self.mem:
+			while self.__undo and (self.size > self.mem):
+				self.__undo.pop(0)
+	
+	@classmethod
+	def apply(cls, entry, data):
+		"""
+		Apply the reversal `entry` to `data`; Returns a tuple: the new 
+		data, and the entry that would reverse that.
+		"""
+		kind, x = entry[:2]
+		if kind == 'ref':
+			return x, ('ref', data)
+		elif kind == 'del':
+			# reinsert deleted values at their original offsets
+			r = []
+			it = iter(data)
+			n = 0
+			for i,v in x:
+				r.extend(itertools.islice(it, i - n))
+				r.append(v)
+				n = i + 1
+			r.extend(it)
+			return r, ('ins', [i for i,v in x])
+		elif kind == 'ins':
+			ins = set(x)
+			return (
+				[v for i,v in enumerate(data) if i not in ins],
+				('del', [(i, data[i]) for i in x])
+			)
+	
+	def esize(self, entry, current=None):
+		"""Estimate the bytes of memory held by `entry`."""
+		kind, x = entry[:2]
+		size = sys.getsizeof(x)
+		if kind == 'del':
+			size += sum([sys.getsizeof(p) + sys.getsizeof(p[1]) for p in x])
+		elif (kind == 'ref') and self.mem and isinstance(x, list):
+			# count only rows the current data doesn't share
+			if isinstance(current, list):
+				ids = set([id(v) for v in current])
+			else:
+				ids = set()
+			size += sum([sys.getsizeof(v) for v in x if id(v) not in ids])
+		return size
+
+
+
+
+
+class QIndex(object):
+	"""
+	A secondary index of a Query's list data; See Query.index().
+	
+	A hash index maps each key to the offsets of the rows that have it.
+	A sorted index keeps parallel lists of keys and offsets, sorted by
+	key, and finds ranges by bisection.
+	
+	Once built, an index is updated by change() as rows are deleted or
+	reinserted. When data is replaced, the index of the previous data 
+	is kept as `prior`, so that undo can restore it.
+	"""
+	def __init__(self, key=None, sorted=False):
+		self.key = key
+		self.sorted = sorted
+		self.callable = callable(key)
+		self.keyfn = keyfn(key)
+		self.version = None
+		self.keys = None
+		self.offsets = None
+		self.prior = None  # (previous data, keys, offsets)
+		self.error = None  # (version, exception) of a failed build
+	
+	def stats(self):
+		return dict(key=self.key, sorted=self.sorted, 
+			built=self.version is not None, 
+			keys=len(self.keys) if self.keys is not None else None
+		)
+	
+	def build(self, data, version):
+		"""Index `data`, unless it's already indexed at `version`."""
+		if version == self.version:
+			return
+		if self.error and (self.error[0] == version):
+			raise self.error[1]
+		try:
+			pairs = []
+			for i,v in enumerate(data):
+				try:
+					pairs.append((self.keyfn(v), i))
+				except (KeyError, IndexError, TypeError):
+					pass # rows without the key aren't indexed
+			if self.sorted:
+				pairs.sort(key=lambda x: x[0])
+				self.keys = [x[0] for x in pairs]
+				self.offsets = [x[1] for x in pairs]
+			else:
+				self.keys = {}
+				for x in pairs:
+					self.keys.setdefault(x[0], []).append(x[1])
+		except Exception as ex:
+			self.version = self.keys = self.offsets = None
+			ex = type(ex)('pdq-index-fail', xdata(
+				python=str(ex), key=self.key, sorted=self.sorted
+			))
+			self.error = (version, ex)
+			raise ex
+		self.version = version
+	
+	def change(self, kind, x, data, version, current, keep=True):
+		"""
+		Update this index for a change that produced `data` at `version`
+		(see Query.__changed). If the index was not `current` before the
+		change, it's left to be rebuilt. For 'ref' changes, the index is
+		kept as `prior` (if `keep`), and restored from prior if `data` 
+		is the data it indexed.
+		"""
+		if kind == 'ref':
+			prior = self.prior
+			self.prior = (x, self.keys, self.offsets) if (
+				current and keep) else None
+			if prior and (prior[0] is data):
+				self.keys, self.offsets = prior[1:]
+				self.version = version
+			else:
+				self.version = self.keys = self.offsets = None
+		elif current:
+			try:
+				if kind == 'del':
+					self.delete(x, len(data) + len(x))
+				else:
+					self.insert(x, len(data) - len(x))
+				self.version = version
+			except Exception:
+				self.version = self.keys = self.offsets = None
+	
+	def delete(self, drop, n):
+		"""
+		Remove rows at sorted offsets `drop` from data of `n` rows; later
+		rows move up.
+		"""
+		self.remap(movemap(n, drop, True))
+	
+	def insert(self, pairs, n):
+		"""
+		Insert rows given as (offset, value) pairs into data of `n` rows.
+		Pairs are sorted by the offset each row has once inserted; other
+		rows move down to make room.
+		"""
+		# each inserted row goes before the existing row at offset `adj`
+		adj = [i - x for x, (i, v) in enumerate(pairs)]
+		self.remap(movemap(n, adj))
+		
+		for i, v in pairs:
+			try:
+				k = self.keyfn(v)
+			except (KeyError, IndexError, TypeError):
+				continue # rows without the key aren't indexed
+			if self.sorted:
+				x = bisect.bisect_right(self.keys, k)
+				self.keys.insert(x, k)
+				self.offsets.insert(x, i)
+			else:
+				bisect.insort(self.keys.setdefault(k, []), i)
+	
+	def remap(self, moved):
+		"""
+		Replace each row offset `i` with moved[i], dropping rows whose 
+		moved offset is None.
+		"""
+		if self.sorted:
+			oo = [moved[i] for i in self.offsets]
+			self.keys = [k for k, o in zip(self.keys, oo) if o is not None]
+			self.offsets = [o for o in oo if o is not None]
+		else:
+			for k in list(self.keys.keys()):
+				oo = [moved[i] for i in self.keys[k]]
+				oo = [o for o in oo if o is not None]
+				if oo:
+					self.keys[k] = oo
+				else:
+					del(self.keys[k])
+	
+	def get(self, value):
+		"""Return the offsets of rows with key `value`."""
+		if self.sorted:
+			a = bisect.bisect_left(self.keys, value)
+			b = bisect.bisect_right(self.keys, value, a)
+			return sorted(self.offsets[a:b])
+		return self.keys.get(value, [])
+	
+	def plan(self, node):
+		"""
+		Return the sorted offsets of rows that may match Pred `node` -
+		a 'cmp' or 'in' node - or None if this index can't tell.
+		"""
+		try:
+			if node[0] == 'in':
+				cc = set()
+				for x in node[2]:
+					cc.update(self.get(x))
+				return sorted(cc)
+			op, value = node[1], node[3]
+			if op == 'eq':
+				return list(self.get(value))
+			elif op == 'ne':
+				return None
+			
+			# Param semantics - gt(10) is 10 > v - so gt and ge are upper
+			# bounds and lt and le are lower bounds.
+			if op in ('gt', 'ge'):
+				a = 0
+				b = (bisect.bisect_left if op == 'gt' else bisect.bisect_right)(
+					self.keys, value
+				)
+			else:
+				a = (bisect.bisect_right if op == 'lt' else bisect.bisect_left)(
+					self.keys, value
+				)
+				b = len(self.keys)
+			return sorted(self.offsets[a:b])
+		except TypeError:
+			# unhashable or incomparable values; scan instead
+			return None
+
+
+
+def movemap(n, points, drop=False):
+	"""
+	Return a list giving the new offset of each of `n` rows when the
+	rows at sorted offsets `points` are removed (if `drop`; their new
+	offset is None), or when a row is inserted before each offset in
+	`points`. Used to update QIndex offsets.
+	"""
+	moved = [None] * n
+	a = 0
+	for x, b in enumerate(points):
+		shift = -x if drop else x
+		moved[a:b] = range(a + shift, b + shift)
+		a = b + 1 if drop else b
+	shift = -len(points) if drop else len(points)
+	moved[a:n] = range(a + shift, n + shift)
+	return moved
+
+
+
+
+
+#
+# PARALLEL
+#
+
+PQ_JOB = None
+
+def pqinit(fn, where, TRow):
+	"""Pool initializer; stores the pmap/pselect job for pqrun()."""
+	global PQ_JOB
+	PQ_JOB = (fn, where, TRow)
+
+
+def pqrun(chunk):
+	"""Run the stored job on `chunk`; see pqchunk()."""
+	fn, where, TRow = PQ_JOB
+	return pqchunk(chunk, fn, where, TRow)
+
+
+def pqchunk(chunk, fn, where, TRow, query=None):
+	"""
+	Return a tuple for a numbered `chunk` of (i, v) pairs: chunk number,
+	results of fn for matching rows (or copies of their values, if fn
+	is None), number of rows, seconds taken, and the worker's name.
+	"""
+	t = time.time()
+	n, pairs = chunk
+	r = []
+	for i, v in pairs:
+		row = TRow(query, v, i)
+		try:
+			if (where is None) or where(row):
+				r.append(fn(row) if fn else row.v[:])
+		except Exception as ex:
+			raise type(ex)('callback-fail', xdata(i=i, v=v, python=str(ex)))
+	worker = "%s/%s" % (
+		multiprocessing.current_process().name, threading.current_thread().name
+	)
+	return (n, r, len(pairs), time.time() - t, worker)
+
+
+
+
+
+#
+# JOIN AND GROUP
+#
+
+def keyfn(spec):
+	"""
+	Return a function that gets the key of a row value. Argument `spec`
+	may be None (the whole value), a callable, an item key, or a list
+	of item keys (for a tuple of items).
+	"""
+	if spec is None:
+		return lambda v: v
+	elif callable(spec):
+		return spec
+	elif isinstance(spec, list):
+		return operator.itemgetter(*spec) if len(spec) > 1 else (
+			lambda v: (v[spec[0]],)
+		)
+	return operator.itemgetter(spec)
+
+
+def jmerge(left, right):
+	"""
+	The default join merge; Returns a new list (for list or tuple rows)
+	or dict (for dict rows). Other values are returned as a pair.
+	"""
+	if isinstance(left, dict) and isinstance(right, (dict, type(None))):
+		d = dict(left)
+		d.update(right or {})
+		return d
+	elif isinstance(left, (list, tuple)):
+		if right is None:
+			return list(left)
+		elif isinstance(right, (list, tuple)):
+			return list(left) + list(right)
+	return [left, right]
+
+
+def hashjoin(left, right, lkey, rkey, how, merge, fill):
+	"""Join iterables by loading `right` into a hash table."""
+	table = {}
+	for v in right:
+		table.setdefault(rkey(v), []).append(v)
+	for v in left:
+		matches = table.get(lkey(v))
+		if matches:
+			for r in matches:
+				yield merge(v, r)
+		elif how == 'left':
+			yield merge(v, fill)
+
+
+def mergejoin(left, right, lkey, rkey, how, merge, fill):
+	"""Join iterables already sorted by key, a group at a time."""
+	rgroups = itertools.groupby(right, rkey)
+	r = next(rgroups, None)
+	for k, lrows in itertools.groupby(left, lkey):
+		while (r is not None) and (r[0] < k):
+			r = next(rgroups, None)
+		if (r is not None) and (r[0] == k):
+			rrows = list(r[1])
+			for v in lrows:
+				for x in rrows:
+					yield merge(v, x)
+			r = next(rgroups, None)
+		elif how == 'left':
+			for v in lrows:
+				yield merge(v, fill)
+
+
+# aggregate functions: (start, add, result); add returns the new state
+AGG_NONE = object()
+AGGREGATES = {
+	'count' : (lambda: 0, lambda a, v: a + 1, None),
+	'sum'   : (lambda: 0, lambda a, v: a + v, None),
+	'min'   : (lambda: AGG_NONE, lambda a, v: v if (a is AGG_NONE) or (
+				v < a) else a, None),
+	'max'   : (lambda: AGG_NONE, lambda a, v: v if (a is AGG_NONE) or (
+				v > a) else a, None),
+	'mean'  : (lambda: (0, 0), lambda a, v: (a[0] + v, a[1] + 1),
+				lambda a: float(a[0]) / a[1] if a[1] else None),
+	'first' : (lambda: AGG_NONE, lambda a, v: v if a is AGG_NONE else a, 
+				None),
+	'last'  : (lambda: AGG_NONE, lambda a, v: v, None),
+	'list'  : (list, lambda a, v: a.append(v) or a, None)
+}
+
+
+class Grouping(object):
+	"""
+	Rows of a Query grouped by key; Returned by Query.groupby().
+	"""
+	def __init__(self, derive, key=None, sorted=False):
+		self.__derive = derive
+		self.__key = keyfn(key)
+		self.__sorted = sorted
+	
+	def agg(self, *a, **k):
+		"""
+		Return a new Query with one row for each group. Each argument is
+		an aggregate specification: the name of an AGGREGATES function,
+		or a tuple - (name, key) - to aggregate the item selected by key
+		(as for Query.join's `on` argument) rather than the whole row.
+		
+		If specifications are given as positional arguments, rows are
+		lists: the group key followed by the aggregate values. If they're
+		given as keyword arguments, rows are dicts with the group key 
+		under 'key' and each aggregate value under its keyword.
+		
+		# EXAMPLE
+		q.groupby(0).agg('count', ('sum', 2), ('max', 3))
+		q.groupby('host').agg(hits='count', bytes=('sum', 'size'))
+		"""
+		if a and k:
+			raise ValueError('pdq-agg-invalid', xdata(
+				reason='positional-or-keyword-args-required'
+			))
+		names = sorted(k.keys()) if k else None
+		specs = [k[n] for n in names] if k else a
+		aggs = []
+		for spec in specs:
+			name, key = spec if isinstance(spec, tuple) else (spec, None)
+			try:
+				start, add, result = AGGREGATES[name]
+			except KeyError:
+				raise KeyError('pdq-agg-invalid', xdata(
+					reason='unknown-aggregate', name=name,
+					valid=sorted(AGGREGATES.keys())
+				))
+			aggs.append((start, add, result, keyfn(key)))
+		
+		if names:
+			def row(key, values):
+				d = dict(zip(names, values))
+				d.setdefault('key', key)
+				return d
+		else:
+			row = lambda key, values: [key] + values
+		
+		gen = self.gensorted if self.__sorted else self.genhash
+		return self.__derive(lambda it: (
+			row(key, values) for key, values in gen(it, aggs)
+		))
+	
+	def genhash(self, it, aggs):
+		"""Aggregate rows of any order; Yields groups in first-seen order."""
+		groups = OrderedDict()
+		gkey = self.__key
+		for v in it:
+			key = gkey(v)
+			try:
+				state = groups[key]
+			except KeyError:
+				state = groups[key] = [x[0]() for x in aggs]
+			for i, x in enumerate(aggs):
+				state[i] = x[1](state[i], x[3](v))
+		for key in groups:
+			yield key, self.result(groups[key], aggs)
+	
+	def gensorted(self, it, aggs):
+		"""Aggregate rows sorted by key, yielding each group as it ends."""
+		for key, rows in itertools.groupby(it, self.__key):
+			state = [x[0]() for x in aggs]
+			for v in rows:
+				for i, x in enumerate(aggs):
+					state[i] = x[1](state[i], x[3](v))
+			yield key, self.result(state, aggs)
+	
+	@classmethod
+	def result(cls, state, aggs):
+		"""Return the list of final values for accumulator `state`."""
+		r = []
+		for i, x in enumerate(aggs):
+			v = x[2](state[i]) if x[2] else state[i]
+			r.append(None if v is AGG_NONE else v)
+		return r
+
+
+
+
+
+#
+# SORT
+#
+
+class Desc(object):
+	"""Wraps a sort key so that it sorts in descending order."""
+	__slots__ = ['v']
+	def __init__(self, v):
+		self.v = v
+	def __lt__(self, other):
+		return other.v < self.v
+	def __gt__(self, other):
+		return self.v < other.v
+	def __eq__(self, other):
+		return self.v == other.v
+	def __ne__(self, other):
+		return not (self.v == other.v)
+
+
+def sortkey(specs):
+	"""
+	Return one key function, of (offset, value) pairs, for a list of 
+	sort `specs` as returned by Query.__sortspecs().
+	"""
+	if len(specs) == 1:
+		f, desc = specs[0]
+		return (lambda p: Desc(f(p))) if desc else f
+	fns = [(lambda p, f=f: Desc(f(p))) if d else f for f, d in specs]
+	return lambda p: tuple([f(p) for f in fns])
+
+
+def sortpairs(pairs, specs):
+	"""
+	Sort a list of (offset, value) pairs by `specs`; Returns a list of
+	values. Keys are computed once per spec and each spec is sorted in
+	a stable pass, from last to first, so no key wrappers are needed.
+	"""
+	order = list(range(len(pairs)))
+	for f, desc in reversed(specs):
+		keys = [f(p) for p in pairs]
+		order.sort(key=keys.__getitem__, reverse=desc)
+	return [pairs[i][1] for i in order]
+
+
+def sortgen(pairs, specs, spill=None):
+	"""
+	Yield values from iterable `pairs`, of (offset, value), sorted by
+	`specs`. If `spill` is given, sorted runs of `spill` pairs are 
+	written to temporary files and merged.
+	"""
+	if not spill:
+		for v in sortpairs(list(pairs), specs):
+			yield v
+		return
+	
+	key = sortkey(specs)
+	run = list(itertools.islice(pairs, spill))
+	if len(run) < spill:
+		for v in sortpairs(run, specs):
+			yield v
+		return
+	
+	files = []
+	try:
+		while run:
+			run.sort(key=key)
+			f = tempfile.TemporaryFile()
+			for p in run:
+				pickle.dump((key(p), p[0], p[1]), f, pickle.HIGHEST_PROTOCOL)
+			f.seek(0)
+			files.append(f)
+			run = list(itertools.islice(pairs, spill))
+		
+		# offsets are unique, so keys are never compared to values
+		for x in heapq.merge(*[spillgen(f) for f in files]):
+			yield x[2]
+	finally:
+		for f in files:
+			f.close()
+
+
+def spillgen(f):
+	"""Yield the items pickled to file `f`."""
+	try:
+		while True:
+			yield pickle.load(f)
+	except EOFError:
+		pass
+
+
+
+
+
+def genread(reader, size=None, close=True):
+	"""
+	Yields the contents of fs `reader`. Plain text readers are read in 
+	decoded blocks of `size` (default: fs.FS_CHUNK); readers of other 
+	types (eg, csv) yield whatever they normally produce. The reader is
+	closed when reading ends, unless `close` is False. Used by lazy 
+	queries.
+	"""
+	try:
+		if type(reader) is Base.module('fs').Reader:
+			it = reader.chunks(size) if size else reader.chunks()
+		else:
+			it = reader
+		for x in it:
+			yield x
+	finally:
+		if close:
+			reader.close()
+		else:
+			reader.detach()
+
+
+def genlines(pieces, keepends=False):
+	"""
+	Yields the lines of text given as a sequence of `pieces` (which may
+	break anywhere, even within a line ending). Used by lazy queries.
+	"""
+	def unend(line):
+		x = line.splitlines()
+		return x[0] if x else line[:0]
+	
+	part = None
+	for piece in pieces:
+		if part:
+			piece = part + piece
+			part = None
+		lines = piece.splitlines(True)
+		if not lines:
+			continue
+		
+		# the last line may continue in the next piece
+		last = lines[-1]
+		if (last[-1:] in ('\r', b'\r')) or (unend(last) == last):
+			part = lines.pop()
+		
+		for line in lines:
+			yield line if keepends else unend(line)
+	
+	if part:
+		yield part if keepends else unend(part)
+
+
+
+
+
 class QRow(Param):
 	"""
 	The parameter object passed to callback functions/lambdas.
+	
+	QRow (like Param) defines __slots__, so rows are small and quick to
+	create; like a Param, a row still accepts other attributes, which
+	are stored in a dict created only when one is set. Even so, 
+	creating a row for each value is the main cost of simple queries
+	on large data. If kwarg reuse=True is given to the 
+	Query constructor (or to rows(), etc...), a single row object is
+	rebound to each value, as Cursor does with its Param. Callbacks must
+	not keep a reused row (or return one - eg, from a Chain method); 
+	keep row.v or row.i instead.
 	"""
+	__slots__ = ['q']
 	
 	@classmethod
 	def paramgen(cls, data, caller, *a, **k):
+		# Pred `where` tests values before rows are created
+		if isinstance(k.get('where'), Pred):
+			k['vwhere'] = k.pop('where').compile(value=True)
 		if isinstance(data, (list, set, tuple)):
 			return cls.pgseq(data, caller, *a, **k)
 		elif isinstance(data, dict):
 			return cls.pgdict(data, caller, *a, **k)
+		elif not isinstance(data, (basestring, pxbytes)):
+			return cls.pgseq(data, caller, *a, **k)
 		
 	@classmethod
 	def pgseq(cls, data, caller, *a, **k):
 		where = k.get('where')
-		for i,v in enumerate(data):
+		vwhere = k.get('vwhere')
+		
+		# an index may select the offsets of candidate rows
+		offsets = k.pop('offsets', None)
+		items = enumerate(data) if offsets is None else (
+			(i, data[i]) for i in offsets
+		)
+		if k.get('reuse'):
+			x = cls(caller, None, None, *a, **k)
+			for i,v in items:
+				if vwhere and not vwhere(v):
+					continue
+				x.v = v
+				x.i = i
+				if (not where) or where(x):
+					yield x
+			return
+		
+		for i,v in items:
+			if vwhere and not vwhere(v):
+				continue
 			x = cls(caller, v, i, *a, **k)
 			if (not where) or where(x):
 				yield x
@@ -270,13 +1548,24 @@ class QRow(Param):
 	@classmethod
 	def pgdict(cls, data, caller, *a, **k):
 		where = k.get('where')
+		vwhere = k.get('vwhere')
+		x = cls(caller, None, None, *a, **k) if k.get('reuse') else None
 		for key in data.keys():
-			x = cls(caller, data[key], key, *a, **k)
-			if (not where) or where(x):
-				yield x
+			if vwhere and not vwhere(data[key]):
+				continue
+			if x is None:
+				r = cls(caller, data[key], key, *a, **k)
+			else:
+				r = x
+				r.v = data[key]
+				r.i = key
+			if (not where) or where(r):
+				yield r
 
 	def __init__(self, query, value, item, *a, **k):
-		Param.__init__(self, value, item)# no args/kwargs! #, *a, **k)
+		# set Param's v and i here, saving a call per row
+		self.v = value
+		self.i = item
 		self.q = query
 	
 	def qq(self, v=None, **k):
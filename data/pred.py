@@ -0,0 +1,426 @@
+"""
+Copyright 2017 Troy Hirni
+This file is part of the pyro project, distributed under the terms
+of the GNU Affero General Public License.
+
+PRED - Compiled predicates for `use` and `where` callbacks.
+
+Predicates are built from the names of the Param comparison methods
+and combined with the &, |, and ~ operators. A predicate compiles to
+a single python function, so a row is tested without the per-row cost
+of Param method calls. Pass one anywhere a `use` or `where` callable
+is accepted by Cursor, ColumnCursor, or pdq.Query.
+
+from pyrox.data.pred import *
+c = cursor.Cursor(data, use=gt(10) & ~eq(3))
+q.select(where=at(0).re('^ERR') | at(2).isin(['a','b']))
+
+Comparisons have the same meaning as the Param methods of the same
+name - the argument is on the left: gt(10) is true where 10 > v. The
+`at` function selects an item (eg, a list offset or dict key) from
+each value to test rather than testing the whole value. The regex
+builder is at(key).re; for the whole value, use `match` (which leaves
+the `re` module alone when this module is star-imported).
+
+Predicates are simplified before compiling: `true` and `false` are
+folded out of & and | expressions, nested & and | are flattened, and
+double negatives are removed. Evaluation short-circuits just as the
+python `and` and `or` operators do.
+
+For ColumnCursor, Pred.kernel() compiles a function that evaluates a
+whole batch in one list comprehension (or, for numpy columns, with
+numpy array operations) and returns a mask.
+"""
+
+import re
+
+from .param import *
+
+__all__ = [
+	'Pred', 'At', 'at', 'pred', 'eq', 'ne', 'gt', 'ge', 'lt', 'le',
+	'match', 'isin', 'true', 'false'
+]
+
+
+# comparison operators, in the form Param uses (argument on the left)
+PRED_OPS = {
+	'eq' : '==', 'ne' : '!=', 'gt' : '>', 'ge' : '>=', 'lt' : '<',
+	'le' : '<='
+}
+
+
+
+
+#
+# PRED
+#
+class Pred(object):
+	"""
+	A predicate expression node. Create predicates with the module's
+	builder functions (eq, gt, at(key).le, etc...) rather than calling
+	the constructor directly.
+	
+	Node forms:
+	 - ('const', bool)
+	 - ('cmp', op, key, value)
+	 - ('re', key, compiled-pattern)
+	 - ('in', key, container)
+	 - ('and', [nodes]), ('or', [nodes]), ('not', node)
+	"""
+	
+	def __init__(self, *node):
+		self.node = node
+		self.__fn = None
+	
+	def __and__(self, other):
+		return Pred('and', [self, pred(other)]).fold()
+	
+	def __or__(self, other):
+		return Pred('or', [self, pred(other)]).fold()
+	
+	def __invert__(self):
+		return Pred('not', self).fold()
+	
+	def __call__(self, p):
+		"""Test Param `p`. (Compiles on first call.)"""
+		if self.__fn is None:
+			self.__fn = self.compile()
+		return self.__fn(p)
+	
+	def __repr__(self):
+		return "<Pred %s>" % self.source()
+	
+	def __getstate__(self):
+		# compiled functions can't be pickled; they're rebuilt on demand
+		return dict(node=self.node)
+	
+	def __setstate__(self, state):
+		self.node = state['node']
+		self.__fn = None
+	
+	@property
+	def const(self):
+		"""True or False for a constant predicate, else None."""
+		return self.node[1] if self.node[0] == 'const' else None
+	
+	
+	# FOLD
+	def fold(self):
+		"""Return a simplified copy of this predicate."""
+		n = self.node
+		if n[0] in ('and', 'or'):
+			stop = (n[0] == 'or') # value that decides the result
+			items = []
+			for x in n[1]:
+				x = x.fold()
+				if x.node[0] == n[0]:
+					items.extend(x.node[1])
+				elif x.const is None:
+					items.append(x)
+				elif x.const == stop:
+					return Pred('const', stop)
+			if not items:
+				return Pred('const', not stop)
+			return items[0] if len(items) == 1 else Pred(n[0], items)
+		
+		elif n[0] == 'not':
+			x = n[1].fold()
+			if x.const is not None:
+				return Pred('const', not x.const)
+			if x.node[0] == 'not':
+				return x.node[1]
+			return Pred('not', x)
+		
+		return self
+	
+	
+	# SOURCE
+	def source(self, var=None, ns=None):
+		"""
+		Return the python expression for this predicate. Argument `var`
+		is a callable that returns the expression for the value selected
+		by a key (None for the whole value). Constants are stored in dict
+		`ns` under the names that appear in the expression.
+		"""
+		ns = {} if ns is None else ns
+		var = var or (lambda k: 'v' if k is None else 'v[%s]' % cname(ns, k))
+		n = self.node
+		t = n[0]
+		if t == 'const':
+			return 'True' if n[1] else 'False'
+		elif t == 'cmp':
+			return "(%s %s %s)" % (cname(ns, n[3]), PRED_OPS[n[1]], var(n[2]))
+		elif t == 're':
+			return "(%s(%s) is not None)" % (cname(ns, n[2].search), var(n[1]))
+		elif t == 'in':
+			return "(%s in %s)" % (var(n[1]), cname(ns, n[2]))
+		elif t == 'not':
+			return "(not %s)" % n[1].source(var, ns)
+		else:
+			j = ' %s ' % t
+			return "(%s)" % j.join([x.source(var, ns) for x in n[1]])
+	
+	
+	# KEYS
+	def keys(self):
+		"""Return the sorted list of keys tested by this predicate."""
+		n = self.node
+		if n[0] in ('and', 'or'):
+			kk = set()
+			for x in n[1]:
+				kk.update(x.keys())
+			return sorted(kk, key=repr)
+		elif n[0] == 'not':
+			return n[1].keys()
+		elif n[0] == 'const':
+			return []
+		return [n[1] if n[0] in ('re', 'in') else n[2]]
+	
+	
+	# COMPILE
+	def compile(self, value=False):
+		"""
+		Return a function that takes a Param (or QRow) argument and
+		returns the predicate's result for the param's value. If `value`
+		is True, the function takes the value itself; this lets callers
+		skip creating params for values that won't be used.
+		"""
+		p = self.fold()
+		ns = {}
+		expr = p.source(None, ns)
+		if value:
+			src = "def pred(v):\n\treturn %s\n" % expr
+		else:
+			src = "def pred(p):\n\tv = p.v\n\treturn %s\n" % expr
+		return pcompile(src, ns, 'pred')
+	
+	
+	# KERNEL
+	def kernel(self):
+		"""
+		Return a function that evaluates this predicate for every row
+		of a ColumnCursor Batch at once, returning a mask (or a single
+		boolean, if the predicate is constant).
+		
+		For a single column, keys (if any) select items from each row's
+		value; for named columns, each key must be a column name.
+		"""
+		p = self.fold()
+		if p.const is not None:
+			c = p.const
+			return lambda b: c
+		
+		keys = p.keys()
+		ns = {}
+		xv = dict([[k, 'x%i' % i] for i,k in enumerate(keys)])
+		
+		# named columns: zip the columns each key refers to
+		nexpr = p.source(lambda k: xv.get(k, 'x'), ns)
+		if keys and (None not in keys):
+			names = ', '.join([xv[k] for k in keys])
+			cols = ', '.join(['v[%s]' % cname(ns, k) for k in keys])
+			zexpr = "zip(%s)" % cols if len(keys) > 1 else cols
+		else:
+			names = zexpr = None
+		
+		# single column: keys select items from each row value
+		sexpr = p.source(lambda k: 'x' if k is None else 'x[%s]' % (
+			cname(ns, k)), ns)
+		
+		# numpy columns are evaluated with array operations
+		ns['isnumpy'] = Base.module('data.cursor').isnumpy
+		
+		src = [
+			"def kernel(b):",
+			"\tv = b.v",
+			"\tif isinstance(v, dict):"
+		]
+		if names:
+			src.extend([
+				"\t\tif isnumpy(v[%s]):" % cname(ns, keys[0]),
+				"\t\t\treturn npkernel(v)",
+				"\t\treturn [%s for %s in %s]" % (nexpr, names, zexpr)
+			])
+		else:
+			src.append("\t\traise KeyError('pred-key-required')")
+		src.extend([
+			"\tif isnumpy(v):",
+			"\t\treturn npkernel(v)",
+			"\treturn [%s for x in v]" % sexpr
+		])
+		ns['npkernel'] = p.npkernel(bool(names))
+		return pcompile('\n'.join(src) + '\n', ns, 'kernel')
+	
+	
+	# NUMPY
+	def npsource(self, var, ns):
+		"""
+		Return a numpy array expression for this predicate; `var` and
+		`ns` are as for source().
+		"""
+		n = self.node
+		t = n[0]
+		if t == 'cmp':
+			return "(%s %s %s)" % (cname(ns, n[3]), PRED_OPS[n[1]], var(n[2]))
+		elif t == 're':
+			return "np.fromiter((%s(s) is not None for s in %s), bool)" % (
+				cname(ns, n[2].search), var(n[1])
+			)
+		elif t == 'in':
+			return "np.isin(%s, %s)" % (var(n[1]), cname(ns, list(n[2])))
+		elif t == 'not':
+			return "(~%s)" % n[1].npsource(var, ns)
+		else:
+			j = ' & ' if t == 'and' else ' | '
+			return "(%s)" % j.join([x.npsource(var, ns) for x in n[1]])
+	
+	
+	def npkernel(self, named):
+		"""
+		Return a function evaluating this (folded, non-constant) predicate
+		over numpy arrays: a dict of columns if `named`, else one column.
+		The function is compiled on first call so numpy is imported only
+		when numpy data is actually given.
+		"""
+		fn = []
+		def npkernel(v):
+			if not fn:
+				ns = dict(np=sys.modules['numpy'])
+				if named:
+					var = lambda k: "v[%s]" % cname(ns, k)
+				else:
+					var = lambda k: 'v' if k is None else 'v[:, %s]' % (
+						cname(ns, k))
+				src = "def npk(v):\n\treturn %s\n" % self.npsource(var, ns)
+				fn.append(pcompile(src, ns, 'npk'))
+			return fn[0](v)
+		return npkernel
+
+
+
+
+#
+# BUILDERS
+#
+class At(object):
+	"""
+	Builds predicates that test the item at `key` of each value (or the
+	whole value, if key is None).
+	"""
+	def __init__(self, key=None):
+		self.key = key
+	
+	def eq(self, v):
+		"""True where v == value."""
+		return Pred('cmp', 'eq', self.key, v)
+	
+	def ne(self, v):
+		"""True where v != value."""
+		return Pred('cmp', 'ne', self.key, v)
+	
+	def gt(self, v):
+		"""True where v > value (as Param.gt)."""
+		return Pred('cmp', 'gt', self.key, v)
+	
+	def ge(self, v):
+		"""True where v >= value (as Param.ge)."""
+		return Pred('cmp', 'ge', self.key, v)
+	
+	def lt(self, v):
+		"""True where v < value (as Param.lt)."""
+		return Pred('cmp', 'lt', self.key, v)
+	
+	def le(self, v):
+		"""True where v <= value (as Param.le)."""
+		return Pred('cmp', 'le', self.key, v)
+	
+	def re(self, pattern, flags=0):
+		"""True where regex `pattern` is found (re.search) in value."""
+		return Pred('re', self.key, re.compile(pattern, flags))
+	
+	def isin(self, values):
+		"""True where value is in `values`."""
+		return Pred('in', self.key, Members(values))
+
+
+def at(key):
+	"""Return an At builder for item `key` of each value."""
+	return At(key)
+
+
+def pred(x):
+	"""Return `x` as a Pred; booleans become constant predicates."""
+	if isinstance(x, Pred):
+		return x
+	if x is True or x is False:
+		return Pred('const', x)
+	raise TypeError('pred-invalid', xdata(
+		reason='pred-or-bool-required', type=str(type(x))
+	))
+
+
+__at = At()
+eq = __at.eq
+ne = __at.ne
+gt = __at.gt
+ge = __at.ge
+lt = __at.lt
+le = __at.le
+match = __at.re
+isin = __at.isin
+true = Pred('const', True)
+false = Pred('const', False)
+
+
+
+
+#
+# UTILITY
+#
+class Members(object):
+	"""
+	The values of an `isin` predicate. Membership is tested with a set
+	when the values (and the value tested) are hashable; otherwise, it
+	falls back to a linear search, just as `v in [...]` would.
+	"""
+	def __init__(self, values):
+		self.items = tuple(values)
+		try:
+			self.set = frozenset(self.items)
+		except TypeError:
+			self.set = None
+	
+	def __contains__(self, v):
+		if self.set is not None:
+			try:
+				return v in self.set
+			except TypeError:
+				pass
+		return v in self.items
+	
+	def __iter__(self):
+		return iter(self.items)
+	
+	def __len__(self):
+		return len(self.items)
+	
+	def __repr__(self):
+		return "<Members %r>" % (self.items,)
+
+
+def cname(ns, value):
+	"""Store constant `value` in `ns`; return its name."""
+	name = "c%i" % len(ns)
+	ns[name] = value
+	return name
+
+
+def pcompile(src, ns, name):
+	"""Compile python source `src` in namespace `ns`; return `name`."""
+	try:
+		exec (compile(src, '<pred>', 'exec'), ns)
+	except Exception as ex:
+		raise type(ex)('pred-compile-fail', xdata(
+			python=str(ex), source=src
+		))
+	return ns[name]
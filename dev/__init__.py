@@ -61,7 +61,8 @@ def debug_hook(t,v,tb):
 class Debug(object):
 	__DEBUG = False
 	__TRACE = False
-	__SYSEX = sys.excepthook
+	__SYSEX = PRIOR_EXCEPTHOOK if (
+		sys.excepthook == deferdebug) else sys.excepthook
 	
 	@classmethod
 	def debug(cls, debug, showtb):
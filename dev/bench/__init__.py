@@ -0,0 +1,111 @@
+"""
+Copyright 2017 Troy Hirni
+This file is part of the pyrox project, distributed under the terms
+of the GNU Affero General Public License.
+
+BENCH - Micro-benchmarks for development.           *EXPERIMENTAL*
+
+Each module in this package defines a report() function that times
+a set of related operations and prints the results in a grid. Run a 
+benchmark from the command line, or call its report() function from
+the interpreter.
+
+python -m pyrox --bench xcost
+"""
+
+import os, shutil, tempfile, timeit
+
+from ... import *
+
+
+BENCH_REPEAT = 3
+
+
+
+def best(fn, number=1, repeat=BENCH_REPEAT):
+	"""Return the best time, in seconds, of `repeat` runs of fn."""
+	return min(timeit.repeat(fn, number=number, repeat=repeat))
+
+
+
+class Bench(object):
+	"""
+	Collects timings for a set of named operations. The first timing
+	is the baseline against which subsequent timings are compared.
+	"""
+	
+	def __init__(self, title, **k):
+		self.title = title
+		self.number = k.get('number', 1)
+		self.repeat = k.get('repeat', BENCH_REPEAT)
+		self.rows = [['TEST:', 'SECONDS:', 'RATIO:']]
+		self.__base = None
+	
+	def time(self, name, fn, number=None):
+		"""Time callable `fn`; Returns the best time."""
+		t = best(fn, number or self.number, self.repeat)
+		if self.__base is None:
+			self.__base = t
+		self.rows.append([
+			name, "%.6f" % t, "%.2fx" % (self.__base/t) if t else '-'
+		])
+		return t
+	
+	def output(self):
+		"""Print the title and timings grid."""
+		print ("\n* %s" % self.title)
+		Base.ncreate('fmt.grid.Grid').output(self.rows)
+
+
+
+class TempDatasets(object):
+	"""
+	Creates data.dataset.Datasets databases in a temporary directory
+	for benchmarks. A reference to each is kept, since Datasets closes
+	its database when it's deleted. The directory is removed by close()
+	or on exiting a `with` block.
+	"""
+	
+	def __init__(self):
+		self.dir = tempfile.mkdtemp()
+		self.__keep = {}
+	
+	def __enter__(self):
+		return self
+	
+	def __exit__(self, *a):
+		self.close()
+	
+	def path(self, name='bench'):
+		"""Return the file path of database `name`."""
+		return os.path.join(self.dir, '%s.db' % name)
+	
+	def create(self, name='bench', **k):
+		"""
+		Return a Datasets for a new, empty database `name`, replacing
+		any that exists. Kwargs are added to the database config (eg,
+		profile, engine).
+		"""
+		self.__keep.pop(name, None)
+		path = self.path(name)
+		for x in ('', '-wal', '-shm'):
+			if os.path.exists(path + x):
+				os.remove(path + x)
+		k['path'] = path
+		ds = self.__keep[name] = Base.module('data.dataset').Datasets(k)
+		return ds
+	
+	def get(self, name='bench'):
+		"""Return the Datasets last created for `name`."""
+		return self.__keep[name]
+	
+	def close(self):
+		"""Release all databases and remove the directory."""
+		self.__keep.clear()
+		shutil.rmtree(self.dir, True)
+
+
+
+def report(name):
+	"""Run the report() function of the bench module `name`."""
+	return Base.module('dev.bench.%s' % name).report()
@@ -0,0 +1,59 @@
+"""
+Copyright 2017 Troy Hirni
+This file is part of the pyrox project, distributed under the terms
+of the GNU Affero General Public License.
+
+CURSOR - Cursor generator dispatch and nested-data iteration.
+
+Compares the type-cached Cursor.gentype() dispatch with probing each
+object's attributes on every call (the previous implementation), and
+Cursor's stack-based reiterate walk with a recursive walk through
+nested cursors.
+"""
+
+import io
+
+from . import *
+
+
+def report(n=20000):
+	cursor = Base.module('data.cursor')
+	Cursor = cursor.Cursor
+	
+	class ProbeCursor(Cursor):
+		"""A Cursor that probes every object, as before the cache."""
+		def gentype(self, x=None, **k):
+			return getattr(self, self.gtprobe(x))
+	
+	# dispatch only
+	objs = [[1], {'a':1}, 'abc', io.StringIO(u'x'), 7, (i for i in [])]
+	c = Cursor([])
+	b = Bench("Cursor.gentype: %i x %i objects" % (n, len(objs)))
+	b.time('probe each call', lambda: [
+		ProbeCursor.gentype(c, x) for i in range(n) for x in objs
+	])
+	b.time('type cache', lambda: [
+		c.gentype(x) for i in range(n) for x in objs
+	])
+	b.output()
+	
+	# many small cursors
+	small = [[i, i+1, i+2] for i in range(n)]
+	b = Bench("Cursor(...).values(): %i small lists" % n)
+	b.time('probe each call', lambda: [ProbeCursor(x).values() for x in small])
+	b.time('type cache', lambda: [Cursor(x).values() for x in small])
+	b.output()
+	
+	# nested data
+	nested = [{'a':[i, [i, i]], 'b':{'c':i}} for i in range(n)]
+	def rwalk(x, r):
+		for p in Cursor(x):
+			if isinstance(p.v, (list, tuple, dict)):
+				rwalk(p.v, r)
+			else:
+				r.append(p.v)
+		return r
+	b = Bench("nested walk: %i records" % n)
+	b.time('recursive cursors', lambda: rwalk(nested, []))
+	b.time('reiterate=True', lambda: Cursor(nested, reiterate=True).values())
+	b.output()
@@ -0,0 +1,51 @@
+"""
+Copyright 2017 Troy Hirni
+This file is part of the pyrox project, distributed under the terms
+of the GNU Affero General Public License.
+
+DATASET - Dataset record ingest.
+
+Compares the per-record Dataset.add() procedure used before batching
+(insert, select max(recid), a find query and possible insert for each
+tag and data value, and a commit for each record and new tag) with the
+batched Dataset.addmany(), loading `n` records into a new database 
+file (commits cost far more on disk than in memory, so an in-memory
+database understates the difference).
+"""
+
+from . import *
+
+
+def report(n=5000):
+	def legacy(ds, dicts):
+		"""The per-record add procedure."""
+		db = ds.db
+		def find(fop, aop, v, commit=False):
+			x = db.opq(fop, (v,)).fetchone()
+			if x:
+				return x[0]
+			db.opq(aop, (v,))
+			if commit:
+				db.commit()
+			return find(fop, aop, v)
+		for d in dicts:
+			db.opq('rec-add', (ds.setid, time.time()))
+			recid = db.opq('rec-max', (ds.setid,)).fetchone()[0]
+			for kw in d:
+				tagid = find('tag-find', 'tag-add', kw, True)
+				dataid = find('data-find', 'data-add', d[kw])
+				db.opq('field-add', (recid, tagid, dataid))
+			db.commit()
+	
+	dicts = [
+		dict(host='host%i' % (i % 50), code=200 + (i % 5), n=i, 
+			path='/p/%i' % (i % 1000))
+		for i in range(n)
+	]
+	
+	with TempDatasets() as tmp:
+		fresh = lambda: tmp.create().dset('bench')
+		b = Bench("Dataset ingest: %i records, 4 fields" % n, repeat=1)
+		b.time('per-record add', lambda: legacy(fresh(), dicts))
+		b.time('addmany', lambda: fresh().addmany(dicts))
+		b.output()
@@ -0,0 +1,41 @@
+"""
+Copyright 2017 Troy Hirni
+This file is part of the pyrox project, distributed under the terms
+of the GNU Affero General Public License.
+
+DBPROFILE - Database profiles.
+
+Compares Dataset ingest into a new database file with no profile (the
+sqlite3 defaults: rollback journal, synchronous=FULL) and with each
+of the DB_PROFILES pragma sets. Records are added by one addmany()
+call per `batch` records, so each profile pays for n/batch commits,
+then read back with Dataset.records().
+"""
+
+from . import *
+
+
+def report(n=5000, batch=10):
+	database = Base.module('data.database')
+	
+	dicts = [
+		dict(host='host%i' % (i % 50), code=200 + (i % 5), n=i,
+			path='/p/%i' % (i % 1000))
+		for i in range(n)
+	]
+	
+	def ingest(profile):
+		ds = tmp.create(profile=profile).dset('bench')
+		for i in range(0, n, batch):
+			ds.addmany(dicts[i:i+batch], batch)
+		for r in ds.records():
+			pass
+	
+	with TempDatasets() as tmp:
+		b = Bench("Dataset add: %i records, %i per commit" % (n, batch),
+			repeat=1
+		)
+		b.time('no profile', lambda: ingest(None))
+		for name in sorted(database.DB_PROFILES.keys()):
+			b.time(name, lambda: ingest(name))
+		b.output()
@@ -0,0 +1,70 @@
+"""
+Copyright 2017 Troy Hirni
+This file is part of the pyrox project, distributed under the terms
+of the GNU Affero General Public License.
+
+DSTORE - Dataset storage engines.
+
+Compares the 'eav' and 'typed' Dataset engines, and typed storage with
+its tags packed into compressed blocks, on a numeric series of `n`
+records: the time to add the records, read them with records(), and
+read one tag's values, and the size of the database file. Reading a
+tag with the eav engine means reading whole records; the typed engine
+reads it with column().
+"""
+
+import math, os
+
+from . import *
+
+
+def report(n=20000):
+	dicts = [
+		dict(t=1500000000 + i * 60, v=round(math.sin(i / 100.0) * 50, 3),
+			host='host%i' % (i % 10))
+		for i in range(n)
+	]
+	
+	names = ('eav', 'typed', 'packed')
+	
+	def load(name, engine, pack=False):
+		ds = tmp.create(name, engine=engine).dset('bench')
+		ds.addmany(dicts)
+		if pack:
+			ds.pack()
+	
+	def dset(name):
+		return tmp.get(name).dset('bench')
+	
+	def readtag(name):
+		ds = dset(name)
+		if ds.engine == 'eav':
+			return [r.get('v') for r in ds.records()]
+		return [v for recid, v in ds.column('v')]
+	
+	with TempDatasets() as tmp:
+		b = Bench("Dataset add: %i records, 3 fields" % n, repeat=1)
+		b.time('eav', lambda: load('eav', 'eav'))
+		b.time('typed', lambda: load('typed', 'typed'))
+		b.time('typed, packed', lambda: load('packed', 'typed', True))
+		b.output()
+		
+		b = Bench("Dataset.records(): %i records" % n, repeat=1)
+		for name in names:
+			b.time(name, lambda: list(dset(name).records()))
+		b.output()
+		
+		b = Bench("Read one tag: %i values" % n, repeat=1)
+		for name in names:
+			b.time(name, lambda: readtag(name))
+		b.output()
+		
+		sizes = [['ENGINE:', 'BYTES:', 'RATIO:']]
+		for name in names:
+			tmp.get(name).db.query("vacuum")
+		base = os.path.getsize(tmp.path('eav'))
+		for name in names:
+			size = os.path.getsize(tmp.path(name))
+			sizes.append([name, str(size), "%.2fx" % (float(base)/size)])
+		print ("\n* Database file size")
+		Base.ncreate('fmt.grid.Grid').output(sizes)
@@ -0,0 +1,38 @@
+"""
+Copyright 2017 Troy Hirni
+This file is part of the pyrox project, distributed under the terms
+of the GNU Affero General Public License.
+
+PRED - Compiled data.pred predicates vs equivalent lambdas.
+"""
+
+import array
+
+from . import *
+
+
+def report(n=200000):
+	cursor = Base.module('data.cursor')
+	P = Base.module('data.pred')
+	
+	data = list(range(n))
+	fn = lambda p: p.gt(n//2) and not p.eq(3) and p.ge(50)
+	pp = P.gt(n//2) & ~P.eq(3) & P.ge(50)
+	
+	b = Bench("Cursor use=: %i rows" % n)
+	b.time('lambda', lambda: cursor.Cursor(data, use=fn).values())
+	b.time('pred', lambda: cursor.Cursor(data, use=pp).values())
+	b.time('pred kernel, ColumnCursor', 
+		lambda: cursor.ColumnCursor(array.array('l', data), use=pp).values()
+	)
+	b.output()
+	
+	rows = [[i, 'ERR' if i%7 else 'ok', i%5] for i in range(n)]
+	q = Base.ncreate('data.pdq.Query', rows)
+	fn = lambda r: r.v[1] == 'ERR' and r.v[2] in (1,2)
+	pp = P.at(1).eq('ERR') & P.at(2).isin((1,2))
+	
+	b = Bench("Query.select where=: %i rows" % n)
+	b.time('lambda', lambda: q.select(where=fn))
+	b.time('pred', lambda: q.select(where=pp))
+	b.output()
@@ -0,0 +1,59 @@
+"""
+Copyright 2017 Troy Hirni
+This file is part of the pyrox project, distributed under the terms
+of the GNU Affero General Public License.
+
+ROWS - Row object allocation in pdq.Query.
+
+Compares rows with a per-instance dict (as QRow was before Chain,
+Param, and QRow defined __slots__), slotted rows, and a single reused
+row (Query kwarg reuse=True) for a select over `n` rows, and reports
+the memory each row object takes. Slotted rows still have a __dict__
+slot, but the dict is only created if a callback sets some other
+attribute.
+
+Pass a larger n (eg, 10000000) from the interpreter to see the effect
+on very large selects:
+
+from pyrox.dev.bench import rows
+rows.report(10000000)
+"""
+
+from . import *
+
+
+def report(n=200000):
+	pdq = Base.module('data.pdq')
+	
+	class DictRow(pdq.QRow):
+		"""A row type that always creates its per-instance __dict__."""
+		def __init__(self, *a, **k):
+			pdq.QRow.__init__(self, *a, **k)
+			self.d = None
+	
+	data = [[i, i % 7] for i in range(n)]
+	sel = lambda r: r.v[0]
+	where = lambda r: r.v[1] == 3
+	
+	qd = pdq.Query(data, row=DictRow)
+	qs = pdq.Query(data)
+	qr = pdq.Query(data, reuse=True)
+	
+	b = Bench("Query.select(fn, where=fn): %i rows" % n)
+	b.time('dict rows', lambda: qd.select(sel, where=where))
+	b.time('slotted rows', lambda: qs.select(sel, where=where))
+	b.time('reuse=True', lambda: qr.select(sel, where=where))
+	b.output()
+	
+	# bytes per row object (reading __dict__ would create it, so only
+	# the dict row's dict is measured)
+	drow = DictRow(qd, data[0], 0)
+	dsize = sys.getsizeof(drow) + sys.getsizeof(drow.__dict__)
+	ssize = sys.getsizeof(pdq.QRow(qs, data[0], 0))
+	print ("\n* Row object memory")
+	Base.ncreate('fmt.grid.Grid').output([
+		['ROW:', 'BYTES:', 'ALLOCATED PER SELECT:'],
+		['dict rows', str(dsize), str(dsize * n)],
+		['slotted rows', str(ssize), str(ssize * n)],
+		['reuse=True', str(ssize), str(ssize)]
+	])
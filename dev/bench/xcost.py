@@ -0,0 +1,37 @@
+"""
+Copyright 2017 Troy Hirni
+This file is part of the pyrox project, distributed under the terms
+of the GNU Affero General Public License.
+
+XCOST - Cost of raising through xdata, eager vs lazy traceback.
+
+The Database.query error path is used since it wraps every failure
+in xdata. Most such exceptions are handled without being displayed,
+so traceback extraction is wasted effort unless XDATA_LAZY is set.
+"""
+
+from . import *
+
+
+def dbfail(db, n):
+	"""Run `n` failing queries on `db`, catching each exception."""
+	for i in range(n):
+		try:
+			db.query("select * from no_such_table")
+		except Exception:
+			pass
+
+
+def report(n=10000):
+	db = Base.ncreate('data.database.Database', None, ':memory:').open()
+	lazy = Base.module('').XDATA_LAZY # the live value, not the imported copy
+	try:
+		b = Bench("xdata: %i failing Database.query calls" % n)
+		xlazy(False)
+		b.time('eager traceback', lambda: dbfail(db, n))
+		xlazy(True)
+		b.time('lazy traceback', lambda: dbfail(db, n))
+		b.output()
+	finally:
+		xlazy(lazy)
+		db.close()
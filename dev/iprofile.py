@@ -0,0 +1,114 @@
+"""
+Copyright 2017 Troy Hirni
+This file is part of the pyrox project, distributed under the terms
+of the GNU Affero General Public License.
+
+IPROFILE - Import time and memory profile.
+
+Each module is imported in a fresh python interpreter so that the
+reported time and RSS include exactly the chain of imports that the
+module requires - the cost a hubcap worker process pays at startup.
+
+python -m pyrox --import-profile              # root and LAZY_MODULES
+python -m pyrox --import-profile fs data.pdq  # specific inner paths
+python -m pyrox --import-profile --budget 0.25
+
+NOTE: RSS values are the current resident set size in kilobytes, as
+      read from /proc/self/statm. Where that's not available, the
+      peak RSS reported by the `resource` module is used instead;
+      on some platforms, neither is available.
+"""
+
+import ast, os, subprocess
+
+from .. import *
+
+
+IPROF_SCRIPT = """
+import sys, time
+def rss():
+	try:
+		import resource
+	except ImportError:
+		resource = None
+	try:
+		with open('/proc/self/statm') as f:
+			return int(f.read().split()[1]) * resource.getpagesize() // 1024
+	except Exception:
+		pass
+	try:
+		return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	except Exception:
+		return None
+sys.path.insert(0, %r)
+r = rss()
+t = time.time()
+%s
+t = time.time() - t
+r1 = rss()
+sys.stdout.write(repr((t, r1, r1 - r if (r and r1) else None, len(sys.modules))))
+"""
+
+
+
+def parentdir():
+	"""Return the directory that must be on sys.path to import pyrox."""
+	inpath = Base.innerpath()
+	path = os.path.abspath(sys.modules[inpath].__file__)
+	for x in inpath.split('.'):
+		path = os.path.dirname(path)
+	return os.path.dirname(path)
+
+
+
+def measure(innerPath=None):
+	"""
+	Import the module at `innerPath` in a new interpreter; returns a
+	tuple: (seconds, rss, rss-added-by-import, module-count). If 
+	`innerPath` is None, the values describe the bare interpreter.
+	"""
+	stmt = "import %s" % Base.innerpath(innerPath) if (
+		innerPath is not None) else "pass"
+	script = IPROF_SCRIPT % (parentdir(), stmt)
+	try:
+		out = subprocess.check_output([sys.executable, '-c', script])
+	except Exception as ex:
+		raise type(ex)('iprofile-fail', xdata(
+			python=str(ex), innerpath=innerPath
+		))
+	return ast.literal_eval(out.decode('ascii'))
+
+
+
+def profile(modules=None, budget=None):
+	"""
+	Return a list of rows, headed by column titles, giving the import
+	time, RSS after the import, RSS added by the import (+RSS), and
+	number of modules the import loaded for the root package
+	and each item in `modules` (default: LAZY_MODULES). If `budget`
+	is given (in seconds), modules whose import takes longer are
+	flagged 'OVER' in the last column.
+	"""
+	modules = modules or LAZY_MODULES
+	n0 = measure()[-1]
+	
+	rr = [['MODULE:', 'SECONDS:', 'RSS:', '+RSS:', 'MODULES:', 'BUDGET:']]
+	for m in [''] + list(modules):
+		t, r, dr, n = measure(m)
+		rr.append([
+			Base.innerpath(m), "%.4f" % t, str(r),
+			'?' if dr is None else str(dr), str(n - n0),
+			'' if budget is None else ('OVER' if t > budget else 'ok')
+		])
+	return rr
+
+
+
+def report(modules=None, budget=None):
+	"""
+	Print the profile() grid; Returns False if any module exceeds the
+	given budget, else True.
+	"""
+	rr = profile(modules, budget)
+	Base.ncreate('fmt.grid.Grid').output(rr)
+	return not [r for r in rr[1:] if r[-1] == 'OVER']
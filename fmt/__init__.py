@@ -168,9 +168,11 @@ class JCompact(JSON):
 class JSONDisplay(json.JSONEncoder):
 	"""
 	Handles unparsable types by returning their representation to be
-	stored as a string.
+	stored as a string. Lazy tracebacks are extracted for display.
 	"""
 	def default(self, obj):
+		if isinstance(obj, LazyTraceback):
+			return obj.list
 		try:
 			try:
 				return json.JSONEncoder.default(self, obj)
@@ -13,7 +13,11 @@ about paths.
 
 from .. import *
 
-import os, os.path as ospath
+import codecs, os, os.path as ospath
+
+
+# default block size for Reader.chunks()
+FS_CHUNK = 65536
 
 
 
@@ -626,6 +630,32 @@ class Reader(Stream):
 				yield line
 	
 	
+	# CHUNKS
+	def chunks(self, size=FS_CHUNK):
+		"""
+		Block generator; reads the stream `size` bytes (or, for text
+		streams, characters) at a time. If an encoding was given, blocks
+		are decoded incrementally, so characters split between blocks 
+		are decoded correctly. Blocks may end anywhere, even mid-line.
+		"""
+		read = self.stream.read
+		k = self.ek
+		decode = None
+		if k:
+			decode = codecs.getincrementaldecoder(k['encoding'])(
+				k.get('errors', 'strict')
+			).decode
+		while True:
+			block = read(size)
+			if not block:
+				break
+			yield decode(block) if decode else block
+		if decode:
+			tail = decode(b'', True)
+			if tail:
+				yield tail
+	
+	
 	# READ
 	def read(self, *a):
 		"""Read any remaining data in the stream."""
@@ -171,6 +171,14 @@ class CSVReader(Reader):
 				stream=stream, coder=coder, dialect=dict(dialect.__dict__)
 			)
 			"""
+			# The first coder shares `stream` and is left in a reference
+			# cycle (its readline is a bound method), so detach it; else
+			# the stream is closed whenever the cycle is collected.
+			try:
+				coder.detach()
+			except NameError:
+				pass
+			
 			# if that fails, try it as a byte stream
 			stream.seek(0)
 			coder = ReadCoder(stream, decode=k.get('encoding', DEF_ENCODE))
@@ -239,7 +247,7 @@ class CSVWriter(Writer):
 	
 	def write(self, data):
 		for row in data:
-			self.__csv.writerow(data)
+			self.__csv.writerow(row)
 	
 		
 	def writerow(self, data):